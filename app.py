@@ -1,56 +1,112 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import time
-import re
 import os
-from datetime import datetime
+import json
+import atexit
+import importlib.util
+
+from precificador import (
+    CAMPOS_IMPORTADOS, COLUNAS_EDITAVEIS, COLUNAS_PRODUTO, COLUNAS_TEXTO, IMPOSTO_PADRAO, MIME_EXPORTACAO, ORDEM_STATUS, REGRAS_PADRAO,
+    ROTULOS_MARGEM, ArmazenamentoCSV, ArmazenamentoSQLite, CatalogoProdutos, GravadorAdiado, PerfilExecucao, agregar_dashboard,
+    ajustar_fretes, aplicar_edicoes, aplicar_mesclagem, calcular_preco_sugerido_reverso, calcular_precos, calcular_precos_sugeridos,
+    carregar_regras, comissao_efetiva, comparar_importacao, compilar_regras, diferencas, distribuicao_margem, exportar_relatorio,
+    grade_cenarios, importar_planilha, ler_planilha_em_blocos, listar_abas, novos_criticos, pico_processo_mb, regras_de_tabelas,
+    salvar_regras, simular_cenarios, sugerir_coluna, tabelas_de_regras, validar_edicoes,
+)
 
 # --- 1. CONFIGURAÇÃO ---
 st.set_page_config(page_title="Precificador 2026 - V64 SafeDB", layout="centered", page_icon="💎")
 
 DB_FILE = "banco_dados.csv"
+DB_SQLITE = "banco_dados.db"
+# "sqlite" (padrão) ou "csv" para manter o arquivo legado
+BACKEND_DADOS = os.environ.get("PRECIFICADOR_BACKEND", "sqlite")
+# Tabela de regras de frete/comissão compartilhada (opcional); sem o arquivo, valem as faixas padrão
+REGRAS_FILE = os.environ.get("PRECIFICADOR_REGRAS", "regras_frete.json")
 
-# Tenta importar Plotly
-try:
-    import plotly.express as px
-    has_plotly = True
-except ImportError:
-    has_plotly = False
+# Plotly só é importado quando o painel de dashboards é desenhado
+has_plotly = importlib.util.find_spec("plotly") is not None
+
+# Perfil de desempenho do rerun, ligado na barra lateral; desligado, as fases não medem nada
+perfil = PerfilExecucao(ativo=st.session_state.get('perfil_ativo', False), memoria=st.session_state.get('perfil_memoria', False))
 
 # --- 2. SISTEMA DE BANCO DE DADOS (BLINDADO) ---
+@st.cache_resource
+def obter_armazenamento(backend=BACKEND_DADOS):
+    if backend == "csv": return ArmazenamentoCSV(DB_FILE)
+    return ArmazenamentoSQLite(DB_SQLITE, csv_legado=DB_FILE)
+
 def carregar_dados_seguro():
-    # Verifica se arquivo existe e não está vazio (size > 0)
-    if os.path.exists(DB_FILE):
-        if os.path.getsize(DB_FILE) > 0:
-            try:
-                df = pd.read_csv(DB_FILE)
-                # Verifica se tem as colunas mínimas necessárias
-                if 'Produto' in df.columns:
-                    return df.to_dict('records')
-            except:
-                pass # Se der erro na leitura, retorna vazio mas não trava
-    return []
-
-def salvar_dados_seguro():
     try:
-        if st.session_state.lista_produtos:
-            df = pd.DataFrame(st.session_state.lista_produtos)
-            df.to_csv(DB_FILE, index=False)
-        else:
-            # Se lista vazia, apaga o arquivo para não dar erro de leitura depois
-            if os.path.exists(DB_FILE): os.remove(DB_FILE)
-        
-        st.session_state.ultimo_save = datetime.now().strftime("%H:%M:%S")
+        return obter_armazenamento().carregar()
     except Exception as e:
-        # Não trava o app, apenas avisa no console/log
-        print(f"Erro ao salvar: {e}")
+        # Não apaga nada: o catálogo continua como estava, o banco fica intacto e o erro fica visível
+        st.error(f"Erro ao carregar banco de dados: {e}")
+        return None
+
+@st.cache_resource
+def obter_catalogo(backend=BACKEND_DADOS):
+    # Um catálogo por processo, compartilhado por todas as sessões: leituras sem cópia, escritas sob a trava dele.
+    # versao_banco = versão do armazenamento que o conteúdo em memória reflete; o carregamento fica com sincronizar_catalogo
+    catalogo = CatalogoProdutos()
+    catalogo.carregado, catalogo.versao_banco = False, None
+    return catalogo
+
+@st.cache_resource
+def obter_gravador(backend=BACKEND_DADOS):
+    # Uma fila de gravação por processo, compartilhada pelas sessões; o que estiver pendente é gravado ao encerrar
+    gravador = GravadorAdiado(obter_armazenamento(backend))
+    atexit.register(gravador.descarregar)
+    return gravador
+
+def gravador_seguro():
+    # Banco que não abre não derruba o app: o erro fica visível e o catálogo segue em memória, sem gravar
+    try:
+        return obter_gravador()
+    except Exception as e:
+        st.error(f"Erro ao abrir banco de dados: {e}")
+        return None
+
+def salvar_dados_seguro(alterados=(), removidos=(), completo=False):
+    # Agenda só as linhas alteradas/removidas; completo=True reescreve o catálogo inteiro (importação, reset).
+    # A gravação acontece em segundo plano, juntando edições seguidas em uma escrita só.
+    gravador = gravador_seguro()
+    if gravador is None: return
+    if completo:
+        gravador.substituir(catalogo.registros(), origem=catalogo.uid)
+    else:
+        registros = [r for r in (catalogo.obter(i) for i in alterados) if r is not None]
+        gravador.agendar(registros, removidos, origem=catalogo.uid)
+
+def sincronizar_catalogo():
+    # Primeira carga do processo, ou outro processo gravou no banco desde a última leitura: recarrega em vez de
+    # sobrescrever depois. Só com a fila vazia, então as alterações deste processo já estão no que for relido.
+    gravador = gravador_seguro()
+    if gravador is None: return
+    # CSV legado ilegível: o banco abre vazio e o aviso fica na tela enquanto o processo roda
+    erro_migracao = getattr(gravador.armazenamento, 'erro_migracao', None)
+    if erro_migracao: st.error(f"Erro ao carregar banco de dados: {erro_migracao}")
+    with catalogo.trava:
+        if gravador.pendente(catalogo.uid): return
+        try: atual = obter_armazenamento().versao()
+        except Exception: return
+        if catalogo.carregado and atual == gravador.versao_apos(catalogo.versao_banco, catalogo.uid):
+            catalogo.versao_banco = atual
+            return
+        # A versão foi lida antes dos dados: se alguém gravar no meio, o pior caso é recarregar de novo depois
+        registros = carregar_dados_seguro()
+        if registros is None: return
+        recarga = catalogo.carregado
+        catalogo.substituir(registros)
+        catalogo.carregado, catalogo.versao_banco = True, atual
+    if recarga: st.toast("Catálogo atualizado com alterações feitas em outro processo.", icon="🔄")
 
 # INICIALIZAÇÃO SEGURA
-if 'lista_produtos' not in st.session_state:
-    st.session_state.lista_produtos = carregar_dados_seguro()
-
-if 'ultimo_save' not in st.session_state:
-    st.session_state.ultimo_save = "-"
+with perfil.fase("Catálogo (carga/sincronização)"):
+    catalogo = obter_catalogo()
+    sincronizar_catalogo()
 
 def init_state(key, value):
     if key not in st.session_state:
@@ -65,6 +121,22 @@ init_state('n_frete', 18.86)
 init_state('n_taxa', 16.5)
 init_state('n_erp', 85.44)
 init_state('n_merp', 20.0)
+init_state('n_tipo', '')
+init_state('n_categoria', '')
+init_state('regras_rev', 0)
+if 'regras' not in st.session_state:
+    st.session_state.regras = REGRAS_PADRAO
+    if os.path.exists(REGRAS_FILE):
+        try: st.session_state.regras = carregar_regras(REGRAS_FILE)
+        except (OSError, ValueError) as e: st.error(f"Regras inválidas em {REGRAS_FILE}: {e}")
+init_state('pagina_feed', 1)
+init_state('tam_pagina', 25)
+init_state('item_aberto', None)
+# Edição em massa: {id: {campo: valor}} pendentes até "Gravar lote"; grade_rev recria as grades depois de mudanças externas
+init_state('edicoes_lote', {})
+init_state('grade_rev', 0)
+init_state('pagina_grade', 1)
+init_state('tam_grade', 500)
 
 # --- 3. DESIGN SYSTEM ---
 st.markdown("""
@@ -100,149 +172,217 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- 4. FUNÇÕES ---
-def limpar_valor_dinheiro(valor):
-    try:
-        if pd.isna(valor) or str(valor).strip() == "" or str(valor).strip() == "-": return 0.0
-        if isinstance(valor, (int, float)): return float(valor)
-        valor_str = str(valor).strip()
-        valor_str = re.sub(r'[^\d,\.-]', '', valor_str)
-        if not valor_str: return 0.0
-        if ',' in valor_str and '.' in valor_str: valor_str = valor_str.replace('.', '').replace(',', '.') 
-        elif ',' in valor_str: valor_str = valor_str.replace(',', '.')
-        return float(valor_str)
-    except: return 0.0
+def fragmento(fn=None, **opcoes):
+    # st.fragment reexecuta só o painel quando os widgets dele mudam; versões antigas rodam junto com o app
+    if fn is None: return lambda f: fragmento(f, **opcoes)
+    deco = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None)
+    return deco(fn, **opcoes) if deco else fn
+
+@fragmento(run_every=2)
+def status_gravacao():
+    # Reflete o que já foi gravado no disco, não o que só foi pedido
+    try: gravador = obter_gravador()
+    except Exception: return st.caption("⚠️ Banco de dados indisponível")
+    if gravador.erro is not None: st.caption(f"⚠️ Erro ao salvar: {gravador.erro} (tentando de novo)")
+    elif gravador.pendente(catalogo.uid): st.caption("Último save: salvando...")
+    else:
+        ultimo = gravador.ultimo_flush(catalogo.uid)
+        st.caption(f"Último save: {ultimo.strftime('%H:%M:%S') if ultimo else '-'}")
 
 def reiniciar_app():
     time.sleep(0.1)
     if hasattr(st, 'rerun'): st.rerun()
     else: st.experimental_rerun()
 
+@st.cache_resource(max_entries=4, show_spinner=False)
+def precos_catalogo(_df_produtos, chave, imposto, _tabela_frete):
+    # Compartilhado entre sessões (cache_resource): o resultado é só leitura.
+    # Argumentos com `_` não são hasheados; aqui e nos caches abaixo quem decide é `chave` (catálogo + parâmetros)
+    return calcular_precos(_df_produtos, imposto, _tabela_frete)
+
+@st.cache_resource(max_entries=3, show_spinner="Gerando relatório...")
+def gerar_relatorio(_df_calc, chave, formato):
+    # Bytes são imutáveis, então cache_resource evita cópias
+    return exportar_relatorio(_df_calc, formato)
+
 # --- 5. SIDEBAR ---
-with st.sidebar:
+with st.sidebar, perfil.fase("Barra lateral"):
     st.header("Ajustes")
     
     # --- CONTROLE DE DADOS ---
     st.markdown("### 💾 Dados")
     if st.button("Forçar Salvamento"):
-        salvar_dados_seguro()
-        st.success("Salvo!")
+        # Grava agora o que estiver na fila, sem esperar a janela de agrupamento
+        gravador = gravador_seguro()
+        if gravador is not None:
+            gravador.descarregar()
+            if gravador.erro is None: st.success("Salvo!")
     
     if st.button("⚠️ Resetar Banco de Dados"):
-        st.session_state.lista_produtos = []
-        salvar_dados_seguro() # Salva vazio
+        catalogo.limpar()
+        salvar_dados_seguro(completo=True) # Salva vazio
         reiniciar_app()
         
-    st.caption(f"Último save: {st.session_state.ultimo_save}")
+    status_gravacao()
     st.divider()
     
-    imposto_padrao = st.number_input("Impostos (%)", value=27.0, step=0.5)
-    with st.expander("Tabela Frete ML (<79)", expanded=True):
-        taxa_12_29 = st.number_input("12-29", value=6.25)
-        taxa_29_50 = st.number_input("29-50", value=6.50)
-        taxa_50_79 = st.number_input("50-79", value=6.75)
-        taxa_minima = st.number_input("Min", value=3.25)
+    imposto_padrao = st.number_input("Impostos (%)", value=IMPOSTO_PADRAO, step=0.5)
+    with st.expander("Regras de Frete e Comissão ML", expanded=True):
+        # Edições valem para esta sessão; "Salvar padrão" grava em REGRAS_FILE para todos
+        arquivo_regras = st.file_uploader("Carregar regras (JSON)", type=['json'], key="upload_regras")
+        if arquivo_regras is not None and st.session_state.get('regras_arquivo') != arquivo_regras.file_id:
+            st.session_state.regras_arquivo = arquivo_regras.file_id
+            try:
+                st.session_state.regras = carregar_regras(arquivo_regras)
+                st.session_state.regras_rev += 1
+            except (ValueError, UnicodeDecodeError) as e: st.error(f"Regras inválidas: {e}")
+        ed_faixas, ed_comissoes, ed_categorias = tabelas_de_regras(st.session_state.regras)
+        rev = st.session_state.regras_rev
+        st.caption("Faixas de preço, em qualquer ordem: valem pelo limite (frete vazio = frete manual do item)")
+        ed_faixas = st.data_editor(ed_faixas, num_rows="dynamic", hide_index=True, key=f"regras_faixas{rev}", column_config={
+            "nome": st.column_config.TextColumn("Faixa"), "ate": st.column_config.NumberColumn("Até R$", format="%.2f"),
+            "frete": st.column_config.NumberColumn("Frete R$", format="%.2f"), "motivo": st.column_config.TextColumn("Descrição")})
+        st.caption("Comissão por tipo de anúncio (outros tipos usam a Taxa ML do item)")
+        ed_comissoes = st.data_editor(ed_comissoes, num_rows="dynamic", hide_index=True, key=f"regras_comissoes{rev}", column_config={
+            "tipo": st.column_config.TextColumn("Tipo"), "comissao": st.column_config.NumberColumn("Comissão %", format="%.1f")})
+        st.caption("Frete por categoria (substitui o da faixa)")
+        ed_categorias = st.data_editor(ed_categorias, num_rows="dynamic", hide_index=True, key=f"regras_categorias{rev}", column_config={
+            "categoria": st.column_config.TextColumn("Categoria"),
+            "faixa": st.column_config.SelectboxColumn("Faixa", options=ed_faixas['nome'].dropna().astype(str).tolist()),
+            "frete": st.column_config.NumberColumn("Frete R$", format="%.2f")})
+        try:
+            regras_atuais = regras_de_tabelas(ed_faixas, ed_comissoes, ed_categorias)
+        except ValueError as e:
+            st.error(f"Regras inválidas: {e}")
+            regras_atuais = st.session_state.regras
+        tabela_frete = compilar_regras(regras_atuais)
+        r1, r2 = st.columns(2)
+        r1.download_button("⬇️ Baixar", json.dumps(regras_atuais, ensure_ascii=False, indent=2), "regras_frete.json", "application/json")
+        if r2.button("💾 Salvar padrão"):
+            salvar_regras(regras_atuais, REGRAS_FILE)
+            st.toast("Regras salvas!", icon="✅")
     st.divider()
     
     # IMPORTAÇÃO
     st.markdown("### 📂 Importar")
-    uploaded_file = st.file_uploader("Excel/CSV", type=['xlsx', 'csv'])
+    uploaded_file = st.file_uploader("Excel/CSV/Parquet", type=['xlsx', 'csv', 'parquet'])
     
     if uploaded_file is not None:
         try:
-            xl = pd.ExcelFile(uploaded_file)
-            aba_selecionada = st.selectbox("1. Aba:", xl.sheet_names, index=0)
-            header_row = st.number_input("2. Linha Cabeçalho:", value=8, min_value=0)
+            eh_csv = uploaded_file.name.lower().endswith(('.csv', '.parquet'))
+            aba_selecionada = st.selectbox("1. Aba:", listar_abas(uploaded_file, uploaded_file.name), index=0)
+            header_row = st.number_input("2. Linha Cabeçalho:", value=0 if eh_csv else 8, min_value=0)
             
-            df_preview = xl.parse(aba_selecionada, header=header_row, nrows=3)
+            df_preview, _ = next(ler_planilha_em_blocos(uploaded_file, uploaded_file.name, aba_selecionada, header_row, tamanho_bloco=3))
             cols = [str(c) for c in df_preview.columns if "Unnamed" not in str(c)]
             
             st.caption("3. Mapear Colunas:")
-            def get_idx(opts, keys):
-                if isinstance(keys, str): keys = [keys]
-                for i, o in enumerate(opts):
-                    for k in keys: 
-                        if k.lower() in str(o).lower(): return i
-                return 0
-
-            c_prod = st.selectbox("Produto", cols, index=get_idx(cols, ["Produto", "Nome"]))
-            c_mlb = st.selectbox("MLB", cols, index=get_idx(cols, ["Anúncio", "MLB"]))
-            c_sku = st.selectbox("SKU", cols, index=get_idx(cols, ["SKU", "Ref"]))
+            def get_idx(opts, campo):
+                sugerida = sugerir_coluna(opts, campo)
+                return opts.index(sugerida) if sugerida else 0
+
+            c_prod = st.selectbox("Produto", cols, index=get_idx(cols, "Produto"))
+            c_mlb = st.selectbox("MLB", cols, index=get_idx(cols, "MLB"))
+            c_sku = st.selectbox("SKU", cols, index=get_idx(cols, "SKU"))
             c_cmv = st.selectbox("CMV", cols, index=get_idx(cols, "CMV"))
-            c_prc = st.selectbox("Preço Venda", cols, index=get_idx(cols, ["Preço", "Venda"]))
-            c_erp = st.selectbox("Preço ERP", cols, index=get_idx(cols, ["ERP", "Base", "GRA"]))
-            c_desc = st.selectbox("Desconto %", cols, index=get_idx(cols, ["Desconto", "%"]))
-            c_bonus = st.selectbox("Rebate/Bônus", cols, index=get_idx(cols, ["Bônus", "Rebate", "Bonus"]))
+            c_prc = st.selectbox("Preço Venda", cols, index=get_idx(cols, "PrecoBase"))
+            c_erp = st.selectbox("Preço ERP", cols, index=get_idx(cols, "PrecoERP"))
+            c_desc = st.selectbox("Desconto %", cols, index=get_idx(cols, "DescontoPct"))
+            c_bonus = st.selectbox("Rebate/Bônus", cols, index=get_idx(cols, "Bonus"))
+            # Opcionais: sem coluna, ficam vazios (comissão da Taxa ML e frete da tabela padrão)
+            opcionais = ["—"] + cols
+            c_tipo = st.selectbox("Tipo de anúncio", opcionais, index=get_idx(opcionais, "TipoAnuncio"))
+            c_cat = st.selectbox("Categoria", opcionais, index=get_idx(opcionais, "Categoria"))
+            
+            modo_importacao = st.radio("4. Modo:", ["Mesclar (MLB/SKU)", "Substituir tudo"], horizontal=True)
+            if modo_importacao == "Mesclar (MLB/SKU)":
+                campos_sync = st.multiselect("Atualizar nos existentes:", CAMPOS_IMPORTADOS, default=["Produto", "CMV", "PrecoERP"])
             
             if st.button("✅ Importar", type="primary"):
-                df = xl.parse(aba_selecionada, header=header_row)
-                cnt = 0
-                st.session_state.lista_produtos = []
-                for _, row in df.iterrows():
-                    try:
-                        p = str(row[c_prod])
-                        if not p or p == 'nan': continue
-                        cmv = limpar_valor_dinheiro(row[c_cmv])
-                        pb = limpar_valor_dinheiro(row[c_prc])
-                        erp = limpar_valor_dinheiro(row[c_erp])
-                        if erp == 0: erp = pb
-                        desc = limpar_valor_dinheiro(row[c_desc])
-                        bonus = limpar_valor_dinheiro(row[c_bonus])
-                        if 0 < desc < 1.0: desc = desc * 100
-                        sku_val = str(row[c_sku]) if c_sku in row else ""
-                        if sku_val == 'nan': sku_val = ""
-                        st.session_state.lista_produtos.append({
-                            "id": int(time.time()*1000)+_, 
-                            "MLB": str(row[c_mlb]), "SKU": sku_val, "Produto": p,
-                            "CMV": cmv, "FreteManual": 18.86, "TaxaML": 16.5, "Extra": 0.0,
-                            "PrecoERP": erp, "MargemERP": 20.0, "PrecoBase": pb, "DescontoPct": desc, "Bonus": bonus       
-                        })
-                        cnt += 1
-                    except: continue
-                
-                salvar_dados_seguro() # Salva no final da importação
-                st.toast(f"{cnt} importados!", icon="🚀")
-                time.sleep(1)
-                reiniciar_app()
+                barra = st.progress(0.0, text="Lendo planilha...")
+                def atualizar_barra(fracao, linhas):
+                    barra.progress(fracao if fracao is not None else 0.0, text=f"{linhas} linhas lidas...")
+                mapa = {'Produto': c_prod, 'MLB': c_mlb, 'SKU': c_sku, 'CMV': c_cmv, 'PrecoBase': c_prc,
+                        'PrecoERP': c_erp, 'DescontoPct': c_desc, 'Bonus': c_bonus,
+                        'TipoAnuncio': None if c_tipo == "—" else c_tipo, 'Categoria': None if c_cat == "—" else c_cat}
+                blocos = ler_planilha_em_blocos(uploaded_file, uploaded_file.name, aba_selecionada, header_row)
+                df_novos, relatorio = importar_planilha(blocos, mapa, progresso=atualizar_barra)
+                st.session_state.relatorio_importacao = relatorio
+
+                if modo_importacao == "Mesclar (MLB/SKU)":
+                    # Não grava nada ainda: o diff fica pendente até a confirmação
+                    st.session_state.mesclagem_pendente = comparar_importacao(catalogo, df_novos, campos_sync)
+                else:
+                    with catalogo.trava:
+                        df_novos['id'] = catalogo.reservar_ids(len(df_novos)) + np.arange(len(df_novos))
+                        catalogo.substituir(df_novos[COLUNAS_PRODUTO].to_dict('records'))
+                    
+                    salvar_dados_seguro(completo=True) # Salva no final da importação, em uma transação
+                    st.toast(f"{relatorio['importadas']} importados!", icon="🚀")
+                    time.sleep(1)
+                    reiniciar_app()
+
+            diff = st.session_state.get('mesclagem_pendente')
+            if diff:
+                st.caption("5. Revisar mesclagem:")
+                m1, m2, m3 = st.columns(3)
+                m1.metric("Novos", len(diff['inserir']))
+                m2.metric("Alterados", len(diff['atualizar']))
+                m3.metric("Ausentes", len(diff['ausentes']))
+                st.caption(f"{diff['inalterados']} sem alteração")
+                if len(diff['conflitos']):
+                    st.warning(f"{len(diff['conflitos'])} linhas ignoradas ou casadas com um de vários produtos")
+                    with st.expander("Ver conflitos"):
+                        st.dataframe(diff['conflitos'], hide_index=True, use_container_width=True)
+                if len(diff['preview']):
+                    with st.expander("Ver alterações"):
+                        st.dataframe(diff['preview'], hide_index=True, use_container_width=True)
+                remover_ausentes = st.checkbox(f"Remover {len(diff['ausentes'])} ausentes da planilha", value=False) if diff['ausentes'] else False
+                b1, b2 = st.columns(2)
+                if b1.button("✔️ Confirmar", type="primary"):
+                    gravados, removidos = aplicar_mesclagem(catalogo, diff, remover_ausentes)
+                    salvar_dados_seguro(alterados=gravados, removidos=removidos)
+                    del st.session_state.mesclagem_pendente
+                    st.toast(f"{len(diff['inserir'])} novos, {len(diff['atualizar'])} alterados", icon="🚀")
+                    time.sleep(1)
+                    reiniciar_app()
+                if b2.button("Cancelar"):
+                    del st.session_state.mesclagem_pendente
+                    reiniciar_app()
+
+            relatorio = st.session_state.get('relatorio_importacao')
+            if relatorio:
+                with st.expander(f"Última importação: {relatorio['importadas']} de {relatorio['lidas']} linhas"):
+                    for motivo, qtd in relatorio['ocorrencias'].items():
+                        if qtd: st.caption(f"{motivo}: {qtd}")
+                    if relatorio['linhas_rejeitadas']:
+                        st.caption("Linhas rejeitadas (após o cabeçalho): " + ", ".join(str(i + 1) for i in relatorio['linhas_rejeitadas']))
         except Exception as e: st.error(f"Erro: {e}")
 
-# --- 6. LÓGICA ---
-def identificar_faixa_frete(preco):
-    if preco >= 79.00: return "manual", 0.0, "Acima de 79 (Manual)"
-    elif 50.00 <= preco < 79.00: return "Tab. 50-79", taxa_50_79, "Faixa R$ 50-79"
-    elif 29.00 <= preco < 50.00: return "Tab. 29-50", taxa_29_50, "Faixa R$ 29-50"
-    elif 12.50 <= preco < 29.00: return "Tab. 12-29", taxa_12_29, "Faixa R$ 12-29"
-    else: return "Tab. Mínima", taxa_minima, "Abaixo de R$ 12.50"
-
-def calcular_preco_sugerido_reverso(custo_base, lucro_alvo_reais, taxa_ml_pct, imposto_pct, frete_manual):
-    custos_fixos_1 = custo_base + frete_manual
-    divisor = 1 - ((taxa_ml_pct + imposto_pct) / 100)
-    if divisor <= 0: return 0.0, "Erro"
-    preco_est_1 = (custos_fixos_1 + lucro_alvo_reais) / divisor
-    if preco_est_1 >= 79.00: return preco_est_1, "Frete Manual"
-    for taxa, nome, p_min, p_max in [
-        (taxa_50_79, "Tab. 50-79", 50, 79), (taxa_29_50, "Tab. 29-50", 29, 50), (taxa_12_29, "Tab. 12-29", 12.5, 29)
-    ]:
-        custos = custo_base + taxa
-        preco = (custos + lucro_alvo_reais) / divisor
-        if p_min <= preco < p_max: return preco, nome
-    return preco_est_1, "Frete Manual"
+    st.markdown("### ⏱️ Desempenho")
+    st.toggle("Perfil do rerun", key="perfil_ativo", help="Tempo (e memória) de cada fase da última execução completa da página")
+    if st.session_state.perfil_ativo: st.checkbox("Medir memória (mais lento)", key="perfil_memoria")
+    # Preenchido no fim do script, quando todas as fases já rodaram
+    area_perfil = st.container()
 
+# --- 6. LÓGICA ---
 def adicionar_produto_action():
     if not st.session_state.n_nome:
         st.toast("Nome obrigatório!", icon="⚠️")
         return
     lucro_alvo = st.session_state.n_erp * (st.session_state.n_merp / 100)
+    taxa = comissao_efetiva(tabela_frete, [st.session_state.n_tipo.strip()], [st.session_state.n_taxa])[0]
     preco_sug, _ = calcular_preco_sugerido_reverso(
         st.session_state.n_cmv + st.session_state.n_extra, lucro_alvo,
-        st.session_state.n_taxa, imposto_padrao, st.session_state.n_frete
+        taxa, imposto_padrao, st.session_state.n_frete, tabela_frete, st.session_state.n_categoria.strip()
     )
-    st.session_state.lista_produtos.append({
-        "id": int(time.time()*1000), "MLB": st.session_state.n_mlb, "SKU": st.session_state.n_sku, 
-        "Produto": st.session_state.n_nome, "CMV": st.session_state.n_cmv, "FreteManual": st.session_state.n_frete,
+    novo = catalogo.adicionar({
+        "id": None, "MLB": st.session_state.n_mlb, "SKU": st.session_state.n_sku, 
+        "Produto": st.session_state.n_nome, "TipoAnuncio": st.session_state.n_tipo.strip(), "Categoria": st.session_state.n_categoria.strip(), "CMV": st.session_state.n_cmv, "FreteManual": st.session_state.n_frete,
         "TaxaML": st.session_state.n_taxa, "Extra": st.session_state.n_extra, "PrecoERP": st.session_state.n_erp, 
         "MargemERP": st.session_state.n_merp, "PrecoBase": preco_sug, "DescontoPct": 0.0, "Bonus": 0.0
     })
-    salvar_dados_seguro()
+    salvar_dados_seguro(alterados=[novo['id']])
     st.toast("Salvo!", icon="✅")
     st.session_state.n_mlb = ""
     st.session_state.n_sku = "" 
@@ -250,6 +390,48 @@ def adicionar_produto_action():
     st.session_state.n_cmv = 0.00
     st.session_state.n_extra = 0.00
 
+def aplicar_repreco_action():
+    repreco = st.session_state.pop('repreco_pendente', None)
+    if repreco is None: return
+    with catalogo.trava:
+        ids = catalogo.atualizar_lote(repreco['id'].tolist(), {'PrecoBase': repreco['PrecoNovo'].to_numpy()})
+    salvar_dados_seguro(alterados=ids)
+    st.toast(f"{len(ids)} preços atualizados!", icon="✅")
+
+def gravar_edicoes_action():
+    # O lote inteiro de uma vez: valida, escreve as colunas no catálogo e agenda uma única gravação
+    edicoes = st.session_state.edicoes_lote
+    with catalogo.trava:
+        lote = aplicar_edicoes(catalogo.tabela(list(edicoes)), edicoes)
+        if len(validar_edicoes(lote, edicoes)):
+            st.toast("Corrija os valores inválidos antes de gravar.", icon="⚠️")
+            return
+        campos = sorted({c for e in edicoes.values() for c in e})
+        ids = catalogo.atualizar_lote(lote['id'].tolist(), {c: lote[c].to_numpy() for c in campos})
+    salvar_dados_seguro(alterados=ids)
+    descartar_edicoes_action()
+    st.toast(f"{len(ids)} produtos atualizados!", icon="✅")
+
+def descartar_edicoes_action():
+    st.session_state.edicoes_lote = {}
+    st.session_state.grade_rev += 1
+
+def aplicar_em_filtrados_action(ids):
+    # Campo e valor lidos dos widgets na hora do clique (o valor pode ter mudado no mesmo rerun)
+    campo, valor = st.session_state.campo_massa, float(st.session_state.valor_massa)
+    for i in ids: st.session_state.edicoes_lote.setdefault(int(i), {})[campo] = valor
+    st.session_state.grade_rev += 1
+
+def ir_para_pagina_grade(pagina):
+    st.session_state.pagina_grade = pagina
+
+def ir_para_pagina(pagina):
+    st.session_state.pagina_feed = pagina
+
+def alternar_item(id_produto):
+    # Só o item aberto monta os widgets de edição e a memória de cálculo
+    st.session_state.item_aberto = None if st.session_state.item_aberto == id_produto else id_produto
+
 # ==============================================================================
 # 7. INTERFACE
 # ==============================================================================
@@ -258,53 +440,51 @@ st.markdown('<div style="text-align:center; padding-bottom:10px;">', unsafe_allo
 st.title("Precificador 2026")
 st.markdown('</div>', unsafe_allow_html=True)
 
-tab_op, tab_bi = st.tabs(["⚡ Operacional", "📊 Dashboards"])
+# on_change="rerun": cada aba sabe se está aberta (`open`), e o painel de dashboards só é montado com a aba dele aberta.
+# Streamlit sem esse parâmetro: todas as abas rodam a cada rerun, como antes
+ABAS = ["⚡ Operacional", "📊 Dashboards", "🧪 Cenários", "📝 Edição em Massa"]
+try: tab_op, tab_bi, tab_cen, tab_lote = st.tabs(ABAS, on_change="rerun")
+except TypeError: tab_op, tab_bi, tab_cen, tab_lote = st.tabs(ABAS)
+
+# Precificação do catálogo inteiro a partir do instantâneo compartilhado; sessões com os mesmos parâmetros
+# reaproveitam a mesma tabela calculada
+with perfil.fase("Precificação do catálogo"):
+    versao_catalogo, df_produtos = catalogo.instantaneo()
+    # Identifica o estado do catálogo + parâmetros de preço para os caches das abas
+    chave_precos = (catalogo.uid, versao_catalogo, imposto_padrao, tabela_frete["assinatura"])
+    df_calc = precos_catalogo(df_produtos, chave_precos, imposto_padrao, tabela_frete)
 
 # --- ABA 1 ---
-with tab_op:
-    mapa_busca = {}
-    opcoes_busca = []
-    if st.session_state.lista_produtos:
-        for p in st.session_state.lista_produtos:
-            label = f"{p['Produto']} (MLB: {p['MLB']})"
-            opcoes_busca.append(label)
-            mapa_busca[label] = p
+with tab_op, perfil.fase("Aba Operacional"):
 
     c_busca, c_sort = st.columns([3, 1])
-    selecao_busca = c_busca.selectbox("Busca", options=opcoes_busca, index=None, placeholder="🔍 Buscar...", label_visibility="collapsed")
-    ordem_sort = c_sort.selectbox("", ["Recentes", "A-Z", "Z-A", "Maior Margem", "Menor Margem", "Maior Preço"], label_visibility="collapsed")
-
-    lista_final = []
-    if selecao_busca:
-        lista_final = [mapa_busca[selecao_busca]]
-    else:
-        temp_list = []
-        for item in st.session_state.lista_produtos:
-            if 'PrecoERP' not in item: item['PrecoERP'] = 0.0
-            pf = item['PrecoBase'] * (1 - item['DescontoPct']/100)
-            _, fr, _ = identificar_faixa_frete(pf)
-            if _ == "manual": fr = item['FreteManual']
-            luc = pf - (item['CMV'] + item['Extra'] + fr + (pf*(imposto_padrao+item['TaxaML'])/100)) + item['Bonus']
-            mrg = (luc/pf*100) if pf else 0
-            view_item = item.copy()
-            view_item.update({'_pf': pf, '_luc': luc, '_mrg': mrg})
-            temp_list.append(view_item)
-            
-        if ordem_sort == "A-Z": temp_list.sort(key=lambda x: str(x['Produto']).lower())
-        elif ordem_sort == "Z-A": temp_list.sort(key=lambda x: str(x['Produto']).lower(), reverse=True)
-        elif ordem_sort == "Maior Margem": temp_list.sort(key=lambda x: x['_mrg'], reverse=True)
-        elif ordem_sort == "Menor Margem": temp_list.sort(key=lambda x: x['_mrg'])
-        elif ordem_sort == "Maior Preço": temp_list.sort(key=lambda x: x['_pf'], reverse=True)
-        else: temp_list.reverse()
-        lista_final = temp_list
-
-    if not selecao_busca:
+    termo_busca = c_busca.text_input("Busca", key="termo_busca", placeholder="🔍 Buscar por nome, MLB ou SKU...", label_visibility="collapsed",
+                                     on_change=ir_para_pagina, args=(1,)).strip()
+    ordem_sort = c_sort.selectbox("", ["Recentes", "A-Z", "Z-A", "Maior Margem", "Menor Margem", "Maior Preço"], label_visibility="collapsed",
+                                  key="ordem_sort", on_change=ir_para_pagina, args=(1,))
+
+    if termo_busca:
+        # Só os melhores resultados do índice vão para o feed, na ordem de relevância
+        ids_busca = catalogo.buscar(termo_busca, k=50)
+        posicoes = pd.Index(df_calc['id']).get_indexer(ids_busca)
+        df_view = df_calc.iloc[posicoes[posicoes >= 0]]
+    elif ordem_sort in ("A-Z", "Z-A"):
+        df_view = df_calc.sort_values('Produto', key=lambda s: s.str.lower(), ascending=(ordem_sort == "A-Z"), kind='stable')
+    elif ordem_sort == "Maior Margem": df_view = df_calc.sort_values('MargemVenda', ascending=False, kind='stable')
+    elif ordem_sort == "Menor Margem": df_view = df_calc.sort_values('MargemVenda', kind='stable')
+    elif ordem_sort == "Maior Preço": df_view = df_calc.sort_values('PrecoFinal', ascending=False, kind='stable')
+    else: df_view = df_calc.iloc[::-1]
+
+    if not termo_busca:
         st.markdown('<div class="input-card">', unsafe_allow_html=True)
         st.caption("CADASTRAR NOVO")
         st.text_input("MLB", key="n_mlb", placeholder="Ex: MLB-12345")
         c1, c2 = st.columns([1, 2])
         c1.text_input("SKU", key="n_sku")
         c2.text_input("Produto", key="n_nome")
+        c8, c9 = st.columns(2)
+        c8.text_input("Tipo de anúncio", key="n_tipo", placeholder="Ex: Clássico, Premium")
+        c9.text_input("Categoria", key="n_categoria")
         c3, c4 = st.columns(2)
         c3.number_input("Custo (CMV)", step=0.01, format="%.2f", key="n_cmv")
         c4.number_input("Frete Manual", step=0.01, format="%.2f", key="n_frete")
@@ -317,28 +497,48 @@ with tab_op:
         st.button("Cadastrar Item", type="primary", use_container_width=True, on_click=adicionar_produto_action)
         st.markdown('</div>', unsafe_allow_html=True)
 
-    if lista_final:
-        st.caption(f"Visualizando {len(lista_final)} produtos")
-        for item in lista_final:
-            pf = item['PrecoBase'] * (1 - item['DescontoPct']/100)
-            nome_frete_real, valor_frete_real, motivo_frete = identificar_faixa_frete(pf)
-            if nome_frete_real == "manual": valor_frete_real = item['FreteManual']
-            imposto_val = pf * (imposto_padrao / 100)
-            comissao_val = pf * (item['TaxaML'] / 100)
-            custos_totais = item['CMV'] + item['Extra'] + valor_frete_real + imposto_val + comissao_val
-            lucro_final = pf - custos_totais + item['Bonus']
-            
-            margem_venda = (lucro_final / pf * 100) if pf > 0 else 0
-            erp_val = item.get('PrecoERP', 0.0)
-            margem_erp = (lucro_final / erp_val * 100) if erp_val > 0 else 0
-            
-            if margem_venda < 8.0: pill_cls = "pill-red"
-            elif 8.0 <= margem_venda < 15.0: pill_cls = "pill-yellow"
-            else: pill_cls = "pill-green"
+        if len(df_calc):
+            with st.expander("🔁 Repreçar Catálogo (lucro alvo do ERP)"):
+                if st.button("Calcular novos preços", key="calc_repreco"):
+                    sugestao = calcular_precos_sugeridos(df_calc, imposto_padrao, tabela_frete)
+                    sugestao = sugestao[(sugestao['FaixaFrete'] != "Erro") & ~np.isclose(sugestao['PrecoNovo'], sugestao['PrecoAtual'], rtol=0, atol=0.005)]
+                    st.session_state.repreco_pendente = sugestao
+                repreco = st.session_state.get('repreco_pendente')
+                if repreco is not None:
+                    variacao = repreco['PrecoNovo'] - repreco['PrecoAtual']
+                    r1, r2, r3 = st.columns(3)
+                    r1.metric("Preços alterados", len(repreco))
+                    r2.metric("Sobem", int((variacao > 0).sum()))
+                    r3.metric("Descem", int((variacao < 0).sum()))
+                    maiores = repreco.assign(Variacao=variacao).loc[variacao.abs().nlargest(200).index]
+                    st.dataframe(maiores.drop(columns=['id']), hide_index=True, use_container_width=True)
+                    st.button("✔️ Aplicar a todos", key="aplicar_repreco", type="primary", on_click=aplicar_repreco_action, disabled=repreco.empty)
+
+    if len(df_view):
+        # Ordenação já foi feita na tabela precalculada; aqui só o recorte da página vira HTML/widgets
+        total_paginas = max(1, -(-len(df_view) // st.session_state.tam_pagina))
+        if st.session_state.pagina_feed > total_paginas: st.session_state.pagina_feed = total_paginas
+        pagina = st.session_state.pagina_feed
+        inicio = (pagina - 1) * st.session_state.tam_pagina
+        df_pagina = df_view.iloc[inicio:inicio + st.session_state.tam_pagina]
+
+        st.caption(f"Visualizando {inicio + 1}-{inicio + len(df_pagina)} de {len(df_view)} produtos")
+        p1, p2, p3, p4 = st.columns([1, 2, 1, 2])
+        p1.button("◀", key="pag_ant", disabled=pagina <= 1, on_click=ir_para_pagina, args=(pagina - 1,), use_container_width=True)
+        p2.number_input("Página", min_value=1, max_value=total_paginas, step=1, key="pagina_feed", label_visibility="collapsed")
+        p3.button("▶", key="pag_prox", disabled=pagina >= total_paginas, on_click=ir_para_pagina, args=(pagina + 1,), use_container_width=True)
+        p4.selectbox("Itens por página", [10, 25, 50, 100], key="tam_pagina", label_visibility="collapsed",
+                     format_func=lambda n: f"{n} por página", on_change=ir_para_pagina, args=(1,))
+
+        for item in df_pagina.to_dict('records'):
+            pf = item['PrecoFinal']
+            lucro_final = item['Lucro']
+            margem_venda = item['MargemVenda']
+            pill_cls = {"Crítico": "pill-red", "Atenção": "pill-yellow"}.get(item['Status'], "pill-green")
 
             txt_pill = f"{margem_venda:.1f}%"
-            txt_luc = f"+ R$ {lucro_final:.2f}" if luc > 0 else f"- R$ {abs(lucro_final):.2f}"
-            sku_show = item.get('SKU', '')
+            txt_luc = f"+ R$ {lucro_final:.2f}" if lucro_final > 0 else f"- R$ {abs(lucro_final):.2f}"
+            sku_show = item['SKU']
             
             st.markdown(f"""
             <div class="feed-card">
@@ -353,17 +553,18 @@ with tab_op:
                 </div>
                 <div class="card-footer">
                     <div class="margin-box"><div>Margem Venda</div><div class="margin-val">{margem_venda:.1f}%</div></div>
-                    <div class="margin-box" style="border-left: 1px solid #eee;"><div>Margem ERP</div><div class="margin-val">{margem_erp:.1f}%</div></div>
+                    <div class="margin-box" style="border-left: 1px solid #eee;"><div>Margem ERP</div><div class="margin-val">{item['MargemSobreERP']:.1f}%</div></div>
                 </div>
             </div>
             """, unsafe_allow_html=True)
             
-            with st.expander("⚙️ Editar e Detalhes"):
-                real_idx = next((i for i, x in enumerate(st.session_state.lista_produtos) if x['id'] == item['id']), -1)
-                if real_idx != -1:
-                    def up_f(k, f, i=real_idx): 
-                        st.session_state.lista_produtos[i][f] = st.session_state[k]
-                        salvar_dados_seguro()
+            aberto = st.session_state.item_aberto == item['id']
+            st.button("✖️ Fechar Detalhes" if aberto else "⚙️ Editar e Detalhes", key=f"ed{item['id']}", on_click=alternar_item, args=(item['id'],))
+            if aberto and item['id'] in catalogo:
+                with st.container(border=True):
+                    def up_f(k, f, id_produto=item['id']): 
+                        catalogo.atualizar(id_produto, {f: st.session_state[k]})
+                        salvar_dados_seguro(alterados=[id_produto])
 
                     c1, c2, c3 = st.columns(3)
                     c1.number_input("Preço", value=float(item['PrecoBase']), key=f"p{item['id']}", on_change=up_f, args=(f"p{item['id']}", 'PrecoBase'))
@@ -378,10 +579,10 @@ with tab_op:
                         <div class="audit-line" style="color:red;"><span>(-) Desconto ({item['DescontoPct']}%)</span> <span>R$ {item['PrecoBase'] - pf:.2f}</span></div>
                         <div class="audit-line audit-bold"><span>(=) VENDA FINAL</span> <span>R$ {pf:.2f}</span></div>
                         <br>
-                        <div class="audit-line"><span>(-) Impostos ({imposto_padrao}%)</span> <span>R$ {imposto_val:.2f}</span></div>
-                        <div class="audit-line"><span>(-) Comissão ({item['TaxaML']}%)</span> <span>R$ {comissao_val:.2f}</span></div>
-                        <div class="audit-line"><span>(-) Frete ({nome_frete_real})</span> <span>R$ {valor_frete_real:.2f}</span></div>
-                        <div class="audit-line" style="font-size:10px; color:#888;">&nbsp;&nbsp;&nbsp;↳ {motivo_frete}</div>
+                        <div class="audit-line"><span>(-) Impostos ({imposto_padrao}%)</span> <span>R$ {item['ValorImposto']:.2f}</span></div>
+                        <div class="audit-line"><span>(-) Comissão ({item['TaxaAplicada']}%)</span> <span>R$ {item['ValorComissao']:.2f}</span></div>
+                        <div class="audit-line"><span>(-) Frete ({item['FaixaFrete']})</span> <span>R$ {item['ValorFrete']:.2f}</span></div>
+                        <div class="audit-line" style="font-size:10px; color:#888;">&nbsp;&nbsp;&nbsp;↳ {item['MotivoFrete']}</div>
                         <div class="audit-line"><span>(-) Custo CMV</span> <span>R$ {item['CMV']:.2f}</span></div>
                         <div class="audit-line"><span>(-) Extras</span> <span>R$ {item['Extra']:.2f}</span></div>
                         <br>
@@ -393,79 +594,304 @@ with tab_op:
                     
                     st.write("")
                     if st.button("🗑️ Excluir", key=f"del{item['id']}"):
-                        del st.session_state.lista_produtos[real_idx]
-                        salvar_dados_seguro()
+                        catalogo.remover(item['id'])
+                        salvar_dados_seguro(removidos=[item['id']])
                         reiniciar_app()
         
         st.markdown("---")
         col_d, col_c = st.columns([2, 1])
-        csv_data = []
-        for it in st.session_state.lista_produtos:
-            pf = it['PrecoBase'] * (1 - it['DescontoPct']/100)
-            _, fr, _ = identificar_faixa_frete(pf)
-            if _ == "manual": fr = it['FreteManual']
-            luc = pf - (it['CMV'] + it['Extra'] + fr + (pf*(imposto_padrao+it['TaxaML'])/100)) + it['Bonus']
-            mrg = (luc/pf*100) if pf else 0
-            mrg_erp_csv = (luc/it.get('PrecoERP', 1)*100) if it.get('PrecoERP', 0) > 0 else 0
-            csv_data.append({
-                "MLB": it['MLB'], "SKU": it.get('SKU', ''), "Produto": it['Produto'],
-                "Preco Venda": pf, "Lucro": luc, "Margem Venda %": mrg, "Margem ERP %": mrg_erp_csv
-            })
-        df_export = pd.DataFrame(csv_data)
-        csv_file = df_export.to_csv(index=False).encode('utf-8')
-        col_d.download_button("📥 Baixar Relatório", csv_file, "precificacao.csv", "text/csv")
+        # O arquivo só é gerado quando pedido e fica em cache até o catálogo ou os parâmetros mudarem
+        formato_export = col_d.radio("Formato", list(MIME_EXPORTACAO), horizontal=True, key="formato_export",
+                                     format_func=lambda f: f[1:].upper(), label_visibility="collapsed")
+        pedido_export = (chave_precos, formato_export)
+        if st.session_state.get('export_pedido') == pedido_export:
+            dados_export = gerar_relatorio(df_calc, chave_precos, formato_export)
+            col_d.download_button("📥 Baixar Relatório", dados_export, f"precificacao{formato_export}", MIME_EXPORTACAO[formato_export])
+        else:
+            col_d.button("📄 Gerar Relatório", key="gerar_export", on_click=lambda: st.session_state.update(export_pedido=pedido_export))
         
         def limpar_tudo_action(): 
-            st.session_state.lista_produtos = []
-            salvar_dados_seguro()
+            catalogo.limpar()
+            salvar_dados_seguro(completo=True)
             reiniciar_app()
             
         col_c.button("🗑️ LIMPAR TUDO", on_click=limpar_tudo_action, type="secondary")
     else:
-        if not selecao_busca: st.info("Lista vazia.")
+        if termo_busca: st.info("Nenhum produto encontrado.")
+        else: st.info("Lista vazia.")
 
 # --- ABA 2 ---
-with tab_bi:
-    if not has_plotly: st.error("Instale 'plotly'")
-    elif len(st.session_state.lista_produtos) > 0:
-        visao_margem = st.radio("Base de Análise:", ["Margem sobre Venda", "Margem sobre ERP"], horizontal=True)
-        rows = []
-        for item in st.session_state.lista_produtos:
-            if 'PrecoERP' not in item: item['PrecoERP'] = 0.0
-            pf = item['PrecoBase'] * (1 - item['DescontoPct']/100)
-            _, fr, _ = identificar_faixa_frete(pf)
-            if _ == "manual": fr = item['FreteManual']
-            luc = pf - (item['CMV'] + item['Extra'] + fr + (pf*(imposto_padrao+item['TaxaML'])/100)) + item['Bonus']
-            mrg_venda = (luc/pf*100) if pf else 0
-            erp_val = float(item.get('PrecoERP', 0.0))
-            mrg_erp = (luc/erp_val*100) if erp_val > 0 else 0
-            mrg_analise = mrg_venda if visao_margem == "Margem sobre Venda" else mrg_erp
-            status = 'Saudável'
-            if mrg_analise < 8: status = 'Crítico'
-            elif mrg_analise < 15: status = 'Atenção'
-            rows.append({'Produto': item['Produto'], 'Margem': mrg_analise, 'Lucro': luc, 'Status': status, 'Venda': pf, 
-                         'Custo': item['CMV'], 'Imposto': pf*(imposto_padrao/100), 'Comissão': pf*(item['TaxaML']/100), 'Frete': fr})
-        
-        df_dash = pd.DataFrame(rows)
-        k1, k2, k3 = st.columns(3)
-        k1.metric("Produtos", len(df_dash))
-        k2.metric(f"Média {visao_margem}", f"{df_dash['Margem'].mean():.1f}%")
-        k3.metric("Lucro Total", f"R$ {df_dash['Lucro'].sum():.2f}")
-        st.divider()
-        
-        counts = df_dash['Status'].value_counts().reset_index()
-        counts.columns = ['Status', 'Qtd']
-        fig = px.bar(counts, x='Status', y='Qtd', color='Status', 
-                     color_discrete_map={'Crítico': '#EF4444', 'Atenção': '#F59E0B', 'Saudável': '#10B981'})
-        st.plotly_chart(fig, use_container_width=True)
-        
-        st.subheader("Dispersão")
-        fig2 = px.scatter(df_dash, x='Venda', y='Margem', color='Status', hover_name='Produto',
-                          color_discrete_map={'Crítico': '#EF4444', 'Atenção': '#F59E0B', 'Saudável': '#10B981'})
-        st.plotly_chart(fig2, use_container_width=True)
-
-        st.subheader("Anatomia do Preço (Top 10)")
-        df_top = df_dash.sort_values(by='Venda', ascending=False).head(10)
-        fig3 = px.bar(df_top, y='Produto', x=['Custo', 'Frete', 'Comissão', 'Imposto', 'Lucro'], orientation='h')
-        st.plotly_chart(fig3, use_container_width=True)
+CORES_STATUS = dict(zip(ORDEM_STATUS, ['#EF4444', '#F59E0B', '#10B981']))
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def agregados_dashboard(_df_calc, chave, sobre_venda, limite_pontos):
+    return agregar_dashboard(_df_calc, sobre_venda, limite_pontos)
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def figuras_dashboard(_agregados, chave, sobre_venda, limite_pontos):
+    import plotly.express as px
+    fig = px.bar(_agregados['status'], x='Status', y='Qtd', color='Status', color_discrete_map=CORES_STATUS)
+    if 'dispersao' in _agregados:
+        fig2 = px.scatter(_agregados['dispersao'], x='Venda', y='Margem', color='Status', hover_name='Produto', color_discrete_map=CORES_STATUS)
+    else:
+        import plotly.graph_objects as go
+        dens = _agregados['densidade']
+        centros_x = (dens['bordas_x'][:-1] + dens['bordas_x'][1:]) / 2
+        centros_y = (dens['bordas_y'][:-1] + dens['bordas_y'][1:]) / 2
+        total = dens['por_status'].sum(axis=-1)
+        fig2 = go.Figure(go.Heatmap(
+            x=centros_x, y=centros_y, z=np.where(total > 0, total, np.nan).T, customdata=dens['por_status'].transpose(1, 0, 2),
+            colorscale='Blues', colorbar=dict(title='Produtos'),
+            hovertemplate="Venda ~R$ %{x:.2f}<br>Margem ~%{y:.1f}%<br>Total: %{z}<br>" +
+                          "<br>".join(f"{s}: %{{customdata[{i}]}}" for i, s in enumerate(CORES_STATUS)) + "<extra></extra>"))
+        amostra = _agregados['amostra']
+        for s, cor in CORES_STATUS.items():
+            pts = amostra[amostra['Status'] == s]
+            fig2.add_trace(go.Scattergl(x=pts['Venda'], y=pts['Margem'], mode='markers', name=s, hoverinfo='skip',
+                                        marker=dict(color=cor, size=3, opacity=0.35)))
+        fig2.update_layout(xaxis_title='Venda', yaxis_title='Margem')
+    fig3 = px.bar(_agregados['top'], y='Produto', x=['Custo', 'Frete', 'Comissão', 'Imposto', 'Lucro'], orientation='h')
+    return fig, fig2, fig3
+
+@fragmento
+def painel_dashboard(df_calc, chave):
+    c_visao, c_limite = st.columns([3, 1])
+    visao_margem = c_visao.radio("Base de Análise:", ["Margem sobre Venda", "Margem sobre ERP"], horizontal=True)
+    limite_pontos = c_limite.number_input("Pontos no gráfico", min_value=500, max_value=200000, value=5000, step=500,
+                                          help="Acima disso a dispersão vira mapa de densidade + amostra em WebGL")
+    sobre_venda = visao_margem == "Margem sobre Venda"
+    agregados = agregados_dashboard(df_calc, chave, sobre_venda, limite_pontos)
+    fig, fig2, fig3 = figuras_dashboard(agregados, chave, sobre_venda, limite_pontos)
+
+    k1, k2, k3 = st.columns(3)
+    k1.metric("Produtos", agregados['n'])
+    k2.metric(f"Média {visao_margem}", f"{agregados['margem_media']:.1f}%")
+    k3.metric("Lucro Total", f"R$ {agregados['lucro_total']:.2f}")
+    st.divider()
+    
+    st.plotly_chart(fig, use_container_width=True)
+    
+    st.subheader("Dispersão")
+    if 'densidade' in agregados: st.caption(f"{agregados['n']} produtos: densidade por faixa de preço x margem, com amostra de {limite_pontos} pontos.")
+    st.plotly_chart(fig2, use_container_width=True)
+
+    st.subheader("Anatomia do Preço (Top 10)")
+    st.plotly_chart(fig3, use_container_width=True)
+
+with tab_bi, perfil.fase("Aba Dashboards"):
+    # Aba fechada: nem agregados nem figuras (nem o import do Plotly); editar um produto não paga pelos gráficos
+    if getattr(tab_bi, 'open', None) is False: pass
+    elif not has_plotly: st.error("Instale 'plotly'")
+    elif len(df_calc) > 0: painel_dashboard(df_calc, chave_precos)
     else: st.info("Adicione produtos para ver os gráficos.")
+
+# --- ABA 3 ---
+MAX_CENARIOS = 2000
+
+def lista_valores(texto):
+    # "27; 28,5" -> (27.0, 28.5): valores separados por ';', vírgula decimal aceita
+    valores = tuple(dict.fromkeys(float(v.strip().replace(',', '.')) for v in texto.split(';') if v.strip()))
+    if not valores: raise ValueError(texto)
+    return valores
+
+def nome_variante(pct): return "Atual" if pct == 0 else f"{pct:+g}%"
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def tabelas_cenario(_regras, chave, ajustes_frete):
+    # Uma tabela compilada por ajuste de frete; `chave` já inclui a assinatura das regras
+    return {nome_variante(p): compilar_regras(ajustar_fretes(_regras, p)) for p in ajustes_frete}
+
+@st.cache_data(max_entries=8, show_spinner="Simulando cenários...")
+def simulacao_cenarios(_df_calc, chave, _regras, impostos, deltas_taxa, deltas_desconto, ajustes_frete):
+    tabelas = tabelas_cenario(_regras, chave, ajustes_frete)
+    return simular_cenarios(_df_calc, grade_cenarios(impostos, deltas_taxa, deltas_desconto, list(tabelas)), tabelas)
+
+def rotulo_cenario(c):
+    return f"Imposto {c.Imposto:g}% · Comissão {c.DeltaTaxa:+g} p.p. · Desconto {c.DeltaDesconto:+g} p.p. · Frete {c.Frete}"
+
+@fragmento
+def painel_cenarios(df_calc, chave, regras):
+    st.caption("Avalia o catálogo inteiro em todas as combinações dos valores abaixo (separados por ';'), sem alterar nenhum preço.")
+    with st.form("form_cenarios"):
+        c1, c2, c3, c4 = st.columns(4)
+        t_imposto = c1.text_input("Imposto %", value=f"{imposto_padrao:g}; {imposto_padrao + 1.5:g}".replace('.', ','))
+        t_taxa = c2.text_input("Δ Comissão (p.p.)", value="0; 1")
+        t_desconto = c3.text_input("Δ Desconto (p.p.)", value="0; 5")
+        t_frete = c4.text_input("Δ Frete tabelado %", value="0; 10", help="Variação das tarifas da tabela de frete; o frete manual não muda")
+        simular = st.form_submit_button("🧪 Simular", type="primary")
+    if simular:
+        try: parametros = tuple(lista_valores(t) for t in (t_imposto, t_taxa, t_desconto, t_frete))
+        except ValueError:
+            st.error("Valores inválidos: use números separados por ';' (ex.: 27; 28,5), ao menos um por campo.")
+            return
+        if np.prod([len(v) for v in parametros]) > MAX_CENARIOS:
+            st.error(f"Grade grande demais: {np.prod([len(v) for v in parametros])} cenários (máximo {MAX_CENARIOS}).")
+            return
+        st.session_state.cenarios = parametros
+    if 'cenarios' not in st.session_state:
+        st.info("Defina os valores e clique em Simular.")
+        return
+    resumo, distribuicao = simulacao_cenarios(df_calc, chave, regras, *st.session_state.cenarios)
+
+    lucro_atual = float(df_calc['Lucro'].sum())
+    melhor, pior = resumo.loc[resumo['Lucro'].idxmax()], resumo.loc[resumo['Lucro'].idxmin()]
+    k1, k2, k3, k4 = st.columns(4)
+    k1.metric("Cenários", len(resumo))
+    k2.metric("Lucro Atual", f"R$ {lucro_atual:.2f}")
+    k3.metric("Melhor Cenário", f"R$ {melhor['Lucro']:.2f}", f"{melhor['DeltaLucro']:+.2f}")
+    k4.metric("Pior Cenário", f"R$ {pior['Lucro']:.2f}", f"{pior['DeltaLucro']:+.2f}")
+    st.dataframe(resumo, hide_index=True, use_container_width=True, column_config={
+        'Imposto': st.column_config.NumberColumn("Imposto %", format="%g"),
+        'DeltaTaxa': st.column_config.NumberColumn("Δ Comissão", format="%+g"),
+        'DeltaDesconto': st.column_config.NumberColumn("Δ Desconto", format="%+g"),
+        'Frete': "Frete", 'Receita': st.column_config.NumberColumn("Receita", format="R$ %.2f"),
+        'Lucro': st.column_config.NumberColumn("Lucro", format="R$ %.2f"),
+        'DeltaLucro': st.column_config.NumberColumn("Δ Lucro", format="R$ %+.2f"),
+        'MargemMedia': st.column_config.NumberColumn("Margem Média", format="%.1f%%"),
+        'Criticos': "Críticos", 'Atencao': "Atenção", 'Saudaveis': "Saudáveis", 'NovosCriticos': "Novos Críticos"})
+
+    st.subheader("Detalhe do Cenário")
+    escolha = st.selectbox("Cenário", range(len(resumo)), format_func=lambda i: rotulo_cenario(resumo.iloc[i]), label_visibility="collapsed")
+    cenario = resumo.iloc[escolha]
+    dist = pd.DataFrame({'Faixa de Margem': ROTULOS_MARGEM, 'Atual': distribuicao_margem(df_calc['MargemVenda'].to_numpy(float))[0],
+                         'Cenário': distribuicao[escolha]})
+    if has_plotly:
+        import plotly.express as px
+        st.plotly_chart(px.bar(dist, x='Faixa de Margem', y=['Atual', 'Cenário'], barmode='group', labels={'value': 'Produtos', 'variable': ''}),
+                        use_container_width=True)
+    else: st.dataframe(dist, hide_index=True, use_container_width=True)
+
+    tabelas = tabelas_cenario(regras, chave, st.session_state.cenarios[3])
+    criticos = novos_criticos(df_calc, tabelas[cenario['Frete']], cenario['Imposto'], cenario['DeltaTaxa'], cenario['DeltaDesconto'])
+    st.markdown(f"##### 🚨 Passam a Crítico: {len(criticos)}")
+    if len(criticos):
+        st.dataframe(criticos.head(1000), hide_index=True, use_container_width=True, column_config={
+            'id': None, 'MargemAtual': st.column_config.NumberColumn("Margem Atual", format="%.1f%%"),
+            'MargemCenario': st.column_config.NumberColumn("Margem no Cenário", format="%.1f%%"),
+            'LucroAtual': st.column_config.NumberColumn("Lucro Atual", format="R$ %.2f"),
+            'LucroCenario': st.column_config.NumberColumn("Lucro no Cenário", format="R$ %.2f")})
+        if len(criticos) > 1000: st.caption("Mostrando os 1000 de pior margem; a lista completa está no CSV.")
+        st.download_button("⬇️ Baixar lista (CSV)", criticos.to_csv(index=False).encode('utf-8'), "novos_criticos.csv", "text/csv")
+
+with tab_cen, perfil.fase("Aba Cenários"):
+    if len(df_calc) > 0: painel_cenarios(df_calc, chave_precos, regras_atuais)
+    else: st.info("Adicione produtos para simular cenários.")
+
+# --- ABA 4 ---
+ROTULOS_GRADE = {
+    'MLB': "MLB", 'SKU': "SKU", 'Produto': "Produto", 'TipoAnuncio': "Tipo Anúncio", 'Categoria': "Categoria", 'CMV': "CMV",
+    'FreteManual': "Frete Manual", 'TaxaML': "Taxa ML %", 'Extra': "Extras", 'PrecoERP': "Preço ERP", 'MargemERP': "Margem ERP %",
+    'PrecoBase': "Preço", 'DescontoPct': "Desc %", 'Bonus': "Bônus",
+}
+COLUNAS_CALCULADAS = ['PrecoFinal', 'Lucro', 'MargemVenda', 'Status']
+
+def contem(coluna, termo):
+    # Filtro "contém" testado uma vez por texto distinto (colunas de texto do catálogo são categóricas)
+    if isinstance(coluna.dtype, pd.CategoricalDtype):
+        achou = np.append(coluna.cat.categories.astype(str).str.lower().str.contains(termo, regex=False), False)
+        return achou[coluna.cat.codes.to_numpy()]
+    return coluna.astype(str).str.lower().str.contains(termo, regex=False).to_numpy()
+
+@fragmento
+def painel_edicao_lote(df_calc, chave):
+    edicoes = st.session_state.edicoes_lote
+    f1, f2, f3 = st.columns([3, 2, 2])
+    termo = f1.text_input("Filtrar", key="filtro_grade", placeholder="🔍 Nome, MLB ou SKU contém...", label_visibility="collapsed",
+                          on_change=ir_para_pagina_grade, args=(1,)).strip().lower()
+    status = f2.multiselect("Status", list(CORES_STATUS), key="status_grade", placeholder="Todos os status", label_visibility="collapsed",
+                            on_change=ir_para_pagina_grade, args=(1,))
+    categorias = [c for c in pd.unique(df_calc['Categoria'].astype(str)) if c]
+    categoria = f3.selectbox("Categoria", ["Todas as categorias"] + sorted(categorias), key="categoria_grade", label_visibility="collapsed",
+                             on_change=ir_para_pagina_grade, args=(1,))
+    filtro = np.ones(len(df_calc), bool)
+    if termo: filtro &= contem(df_calc['Produto'], termo) | contem(df_calc['MLB'], termo) | contem(df_calc['SKU'], termo)
+    if status: filtro &= df_calc['Status'].isin(status).to_numpy()
+    if categoria != "Todas as categorias": filtro &= (df_calc['Categoria'].astype(str) == categoria).to_numpy()
+    df_filtro = df_calc[filtro]
+
+    with st.expander(f"Aplicar um valor a todos os {len(df_filtro)} produtos filtrados"):
+        a1, a2, a3 = st.columns([2, 2, 1])
+        a1.selectbox("Campo", [c for c in COLUNAS_EDITAVEIS if c not in COLUNAS_TEXTO], format_func=ROTULOS_GRADE.get, key="campo_massa")
+        a2.number_input("Valor", step=0.5, format="%.2f", key="valor_massa")
+        a3.button("Aplicar", key="aplicar_massa", on_click=aplicar_em_filtrados_action, args=(df_filtro['id'].tolist(),),
+                  disabled=df_filtro.empty, use_container_width=True)
+
+    if df_filtro.empty: st.info("Nenhum produto com esses filtros.")
+    else:
+        total_paginas = max(1, -(-len(df_filtro) // st.session_state.tam_grade))
+        if st.session_state.pagina_grade > total_paginas: st.session_state.pagina_grade = total_paginas
+        pagina = st.session_state.pagina_grade
+        inicio = (pagina - 1) * st.session_state.tam_grade
+        p1, p2, p3 = st.columns([4, 1, 2])
+        p1.caption(f"Linhas {inicio + 1}-{min(inicio + st.session_state.tam_grade, len(df_filtro))} de {len(df_filtro)}")
+        p2.number_input("Página", min_value=1, max_value=total_paginas, step=1, key="pagina_grade", label_visibility="collapsed")
+        p3.selectbox("Linhas por página", [100, 500, 1000, 2000], key="tam_grade", label_visibility="collapsed",
+                     format_func=lambda n: f"{n} por página", on_change=ir_para_pagina_grade, args=(1,))
+
+        # A grade mostra o catálogo com as edições pendentes por cima; as colunas calculadas são as atuais
+        original = df_filtro.iloc[inicio:inicio + st.session_state.tam_grade][['id'] + COLUNAS_EDITAVEIS + COLUNAS_CALCULADAS]
+        original = original.astype({c: object for c in COLUNAS_TEXTO}).reset_index(drop=True)
+        exibido = original.copy()
+        pendentes = {i: edicoes[i] for i in original['id'].tolist() if i in edicoes}
+        if pendentes:
+            editado = aplicar_edicoes(original, pendentes)
+            posicoes = pd.Index(original['id']).get_indexer(editado['id'])
+            for c in COLUNAS_EDITAVEIS: exibido.loc[posicoes, c] = editado[c].to_numpy()
+        grade = st.data_editor(
+            exibido, hide_index=True, use_container_width=True, num_rows="fixed", disabled=['id'] + COLUNAS_CALCULADAS,
+            key=f"grade_{st.session_state.grade_rev}_{chave[1]}_{pagina}_{st.session_state.tam_grade}_{termo}_{status}_{categoria}",
+            column_config={'id': None, **ROTULOS_GRADE,
+                           'PrecoFinal': st.column_config.NumberColumn("Venda Atual", format="R$ %.2f"),
+                           'Lucro': st.column_config.NumberColumn("Lucro Atual", format="R$ %.2f"),
+                           'MargemVenda': st.column_config.NumberColumn("Margem Atual", format="%.1f%%"), 'Status': "Status Atual"})
+        # Edições desta página substituem as pendentes dela; as das outras páginas continuam guardadas
+        for i in original['id'].tolist(): edicoes.pop(i, None)
+        edicoes.update(diferencas(original, grade))
+
+    if not edicoes:
+        st.caption("Edite as células da grade (várias linhas e páginas) e grave tudo de uma vez.")
+        return
+    # Prévia do lote: repreço vetorizado só das linhas editadas, contra o cálculo atual
+    lote = aplicar_edicoes(df_calc[COLUNAS_PRODUTO], edicoes)
+    problemas = validar_edicoes(lote, edicoes)
+    antes = df_calc.set_index('id').loc[lote['id']]
+    depois = calcular_precos(lote, imposto_padrao, tabela_frete)
+    k1, k2, k3, k4 = st.columns(4)
+    k1.metric("Produtos Editados", len(lote))
+    k2.metric("Células", sum(len(e) for e in edicoes.values()))
+    k3.metric("Δ Lucro", f"R$ {depois['Lucro'].sum() - antes['Lucro'].sum():+.2f}")
+    k4.metric("Mudam de Status", int((depois['Status'].to_numpy() != antes['Status'].to_numpy()).sum()))
+    if len(problemas):
+        st.error(f"{len(problemas)} valores inválidos; corrija antes de gravar.")
+        st.dataframe(problemas.drop(columns=['id']), hide_index=True, use_container_width=True)
+    else:
+        previa = pd.DataFrame({
+            'Produto': lote['Produto'], 'Venda Antes': antes['PrecoFinal'].to_numpy(), 'Venda Depois': depois['PrecoFinal'].to_numpy(),
+            'Margem Antes': antes['MargemVenda'].to_numpy(), 'Margem Depois': depois['MargemVenda'].to_numpy(),
+            'Status Antes': antes['Status'].to_numpy(), 'Status Depois': depois['Status'].to_numpy()})
+        with st.expander("Prévia do lote"):
+            st.dataframe(previa.head(1000), hide_index=True, use_container_width=True)
+    b1, b2 = st.columns(2)
+    if b1.button(f"💾 Gravar {len(lote)} produtos", key="gravar_lote", type="primary", disabled=bool(len(problemas)), use_container_width=True):
+        gravar_edicoes_action()
+        reiniciar_app()
+    if b2.button("↩️ Descartar edições", key="descartar_lote", use_container_width=True):
+        descartar_edicoes_action()
+        reiniciar_app()
+
+with tab_lote, perfil.fase("Aba Edição em Massa"):
+    if len(df_calc) > 0: painel_edicao_lote(df_calc, chave_precos)
+    else: st.info("Adicione produtos para editar em massa.")
+
+# --- PERFIL DO RERUN ---
+if perfil.ativo:
+    total_ms = perfil.finalizar()
+    pico = pico_processo_mb()
+    with area_perfil:
+        st.caption(f"Última execução completa: {total_ms:.0f} ms · {len(catalogo)} produtos"
+                   + (f" · pico do processo {pico:.0f} MB" if pico is not None else "")
+                   + ". Painéis que se atualizam sozinhos (fragmentos) não entram aqui.")
+        st.dataframe(perfil.tabela(), hide_index=True, use_container_width=True, column_config={
+            'Tempo (ms)': st.column_config.NumberColumn(format="%.1f"),
+            'Pico alocado (MB)': st.column_config.NumberColumn(format="%.1f"),
+            'Retido (MB)': st.column_config.NumberColumn(format="%.1f")})
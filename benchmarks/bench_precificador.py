@@ -0,0 +1,129 @@
+# Benchmark das etapas do Precificador em catálogos sintéticos, com o mesmo código que o app e a CLI usam:
+#   python benchmarks/bench_precificador.py                           (1k, 10k, 100k)
+#   python benchmarks/bench_precificador.py --tamanhos 1000000 --memoria --saida bench.csv
+# A planilha gerada imita a exportação do ERP (valores em texto BRL "R$ 1.234,56", desconto "10%", "-" = vazio).
+# Resultado: tempo (ms) de cada etapa por tamanho; com --memoria, também o pico alocado (mais lento).
+import argparse
+import io
+import itertools
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from precificador import (  # noqa: E402
+    CAMPOS_IMPORTADOS, COLUNAS_NUMERICAS, IMPOSTO_PADRAO, ArmazenamentoCSV, ArmazenamentoSQLite, CatalogoProdutos, PerfilExecucao,
+    agregar_dashboard, ajustar_fretes, calcular_precos, calcular_precos_sugeridos, compilar_regras, exportar_relatorio, grade_cenarios,
+    importar_planilha, ler_planilha_em_blocos, pico_processo_mb, regras_frete, simular_cenarios, sugerir_coluna,
+)
+
+PALAVRAS = ["Kit", "Capa", "Suporte", "Cabo", "Fone", "Mouse", "Teclado", "Carregador", "Película", "Garrafa", "Mochila", "Luminária",
+            "Organizador", "Adaptador", "Relógio", "Caneca", "Tapete", "Lanterna", "Escova", "Toalha"]
+MODIFICADORES = ["Premium", "Slim", "Pro", "Max", "Mini", "Inox", "Gamer", "Infantil", "Térmica", "USB-C", "Bluetooth", "Magnético"]
+CATEGORIAS = ["Informática", "Celulares", "Casa", "Esportes", "Beleza", "Brinquedos", "Ferramentas", ""]
+
+def brl(valores):
+    # 1234.5 -> "R$ 1.234,50"
+    txt = pd.Series(np.round(valores, 2)).map("{:,.2f}".format)
+    return "R$ " + txt.str.replace(",", "_", regex=False).str.replace(".", ",", regex=False).str.replace("_", ".", regex=False)
+
+def gerar_planilha(n, semente=0):
+    rng = np.random.default_rng(semente)
+    cmv = rng.gamma(2.0, 25.0, n) + 2
+    preco = cmv * rng.uniform(1.2, 3.0, n)
+    bonus = np.where(rng.random(n) < 0.1, rng.uniform(1, 10, n), 0.0)
+    ids = pd.Series(np.arange(n)).astype(str)
+    nomes = (pd.Series(np.array(PALAVRAS)[rng.integers(0, len(PALAVRAS), n)]) + " "
+             + pd.Series(np.array(MODIFICADORES)[rng.integers(0, len(MODIFICADORES), n)]) + " " + ids.str.zfill(7))
+    # Ordem das colunas importa: sugerir_coluna pega a primeira que contém a palavra-chave
+    return pd.DataFrame({
+        "Anúncio": "MLB" + (3_000_000_000 + pd.Series(np.arange(n))).astype(str),
+        "SKU": "SKU-" + ids,
+        "Produto": nomes,
+        "Tipo de anúncio": np.where(rng.random(n) < 0.3, "Premium", "Clássico"),
+        "Categoria": np.array(CATEGORIAS)[rng.integers(0, len(CATEGORIAS), n)],
+        "CMV": brl(cmv),
+        "Preço Venda": brl(preco),
+        "Preço ERP": brl(preco * rng.uniform(0.9, 1.1, n)),
+        "Desconto": pd.Series(rng.choice([0, 0, 0, 5, 10, 15, 20], n)).astype(str) + "%",
+        "Bônus": brl(bonus).where(bonus > 0, "-"),
+    })
+
+def medir(n, pasta, memoria=False, xlsx=False, consultas=100):
+    perfil = PerfilExecucao(memoria=memoria)
+    caminho = os.path.join(pasta, f"catalogo_{n}.csv")
+    gerar_planilha(n).to_csv(caminho, sep=';', index=False)
+    regras = regras_frete()
+    regras["comissao_por_tipo"] = {"Premium": 19.0}
+    tabela_frete = compilar_regras(regras)
+
+    with perfil.fase("importar CSV (BRL)"), open(caminho, 'rb') as arquivo:
+        blocos = ler_planilha_em_blocos(arquivo, caminho, "CSV", 0, tamanho_bloco=50000)
+        primeiro, fracao = next(blocos)
+        colunas = list(primeiro.columns)
+        mapa = {c: sugerir_coluna(colunas, c) for c in dict.fromkeys(CAMPOS_IMPORTADOS + COLUNAS_NUMERICAS)}
+        importado, _ = importar_planilha(itertools.chain([(primeiro, fracao)], blocos), mapa)
+    with perfil.fase("carregar catálogo"):
+        catalogo = CatalogoProdutos(importado.to_dict('records'))
+    with perfil.fase("instantâneo"):
+        _, df = catalogo.instantaneo()
+    with perfil.fase("precificar"):
+        df_calc = calcular_precos(df, IMPOSTO_PADRAO, tabela_frete)
+    with perfil.fase("repreço reverso"):
+        calcular_precos_sugeridos(df_calc, IMPOSTO_PADRAO, tabela_frete)
+    with perfil.fase("ordenar (A-Z, margem)"):
+        df_calc.sort_values('Produto', key=lambda s: s.str.lower(), kind='stable')
+        df_calc.sort_values('MargemVenda', ascending=False, kind='stable')
+    termos = [t.split()[0][:4] + " " + t.split()[-1][-3:] for t in importado['Produto'].sample(consultas, replace=True, random_state=0)]
+    with perfil.fase(f"buscar ({consultas} consultas)"):
+        for termo in termos: catalogo.buscar(termo, k=50)
+    with perfil.fase("agregar dashboard"):
+        agregar_dashboard(df_calc, True, 5000)
+    variantes = {f"{p:+g}%": compilar_regras(ajustar_fretes(regras, p)) for p in (0, 10)}
+    grade = grade_cenarios([26.0, 27.0, 28.0, 29.0, 30.0], [0.0, 1.0, 2.0, 3.0, 4.0], [0.0, 5.0], list(variantes))
+    with perfil.fase(f"cenários ({len(grade)})"):
+        simular_cenarios(df_calc, grade, variantes)
+    formatos = ['.csv', '.parquet'] + (['.xlsx'] if xlsx or n <= 10_000 else [])
+    for formato in formatos:
+        with perfil.fase(f"exportar {formato[1:].upper()}"):
+            exportar_relatorio(df_calc, formato, destino=io.BytesIO())
+    registros = catalogo.registros()
+    for nome, armazenamento in (("SQLite", ArmazenamentoSQLite(os.path.join(pasta, f"banco_{n}.db"))),
+                                ("CSV", ArmazenamentoCSV(os.path.join(pasta, f"banco_{n}.csv")))):
+        with perfil.fase(f"salvar {nome}"):
+            armazenamento.substituir(registros)
+        with perfil.fase(f"ler {nome}"):
+            armazenamento.carregar()
+    perfil.finalizar()
+    return perfil.tabela().assign(Produtos=n)
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark das etapas do Precificador em catálogos sintéticos.")
+    p.add_argument("--tamanhos", type=int, nargs="+", default=[1000, 10000, 100000], help="produtos por catálogo (padrão: %(default)s)")
+    p.add_argument("--memoria", action="store_true", help="mede o pico alocado por etapa com tracemalloc (bem mais lento)")
+    p.add_argument("--xlsx", action="store_true", help="exporta XLSX também acima de 10 mil produtos (openpyxl é a etapa mais lenta)")
+    p.add_argument("--saida", help="grava os resultados (.csv) para comparar entre versões")
+    args = p.parse_args(argv)
+    resultados = []
+    with tempfile.TemporaryDirectory() as pasta:
+        for n in args.tamanhos:
+            inicio = time.perf_counter()
+            resultados.append(medir(n, pasta, memoria=args.memoria, xlsx=args.xlsx))
+            pico = pico_processo_mb()
+            print(f"{n} produtos: {time.perf_counter() - inicio:.1f}s" + (f" (pico do processo {pico:.0f} MB)" if pico else ""), file=sys.stderr)
+    tabela = pd.concat(resultados, ignore_index=True)
+    resumo = tabela.pivot(index='Fase', columns='Produtos', values='Tempo (ms)').reindex(tabela['Fase'].drop_duplicates())
+    print(resumo.round(1).to_string())
+    if args.memoria:
+        print("\nPico alocado (MB)")
+        print(tabela.pivot(index='Fase', columns='Produtos', values='Pico alocado (MB)').reindex(resumo.index).round(1).to_string())
+    if args.saida: tabela.to_csv(args.saida, index=False)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
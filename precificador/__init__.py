@@ -0,0 +1,22 @@
+# Núcleo do Precificador sem Streamlit: precificação, importação, catálogo e persistência
+from .precos import (
+    COLUNAS_NUMERICAS, COLUNAS_PRODUTO, COLUNAS_TEXTO, FRETE_PADRAO, IMPOSTO_PADRAO, MARGEM_ATENCAO, MARGEM_CRITICA,
+    calcular_preco_sugerido_reverso, calcular_precos, calcular_precos_sugeridos, classificar_margem,
+    comissao_efetiva, resolver_preco_reverso, tabela_produtos,
+)
+from .regras import (
+    REGRAS_PADRAO, ajustar_fretes, carregar_regras, compilar_regras, montar_tabela_frete, normalizar_regras, regras_de_tabelas,
+    regras_frete, salvar_regras, tabelas_de_regras,
+)
+from .importacao import (
+    CAMPOS_IMPORTADOS, VALORES_PADRAO, aplicar_mesclagem, comparar_importacao, importar_planilha,
+    ler_planilha_em_blocos, limpar_coluna_dinheiro, limpar_coluna_texto, listar_abas, normalizar_bloco,
+    somar_ocorrencias, sugerir_coluna,
+)
+from .exportacao import COLUNAS_RELATORIO, MIME_EXPORTACAO, EscritorTabela, exportar_relatorio, relatorio_precificacao
+from .cenarios import ROTULOS_MARGEM, distribuicao_margem, grade_cenarios, novos_criticos, simular_cenarios
+from .edicao import COLUNAS_EDITAVEIS, LIMITES_EDICAO, aplicar_edicoes, diferencas, validar_edicoes
+from .dashboard import ORDEM_STATUS, agregar_dashboard
+from .perfil import PerfilExecucao, pico_processo_mb
+from .catalogo import CatalogoProdutos, IndiceBusca
+from .armazenamento import ArmazenamentoCSV, ArmazenamentoSQLite, GravadorAdiado
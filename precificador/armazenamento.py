@@ -0,0 +1,294 @@
+# Backends de persistência do catálogo (SQLite transacional e CSV legado) e gravação adiada em segundo plano
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos, só a da thread
+    fcntl = None
+
+import pandas as pd
+
+from .precos import COLUNAS_NUMERICAS, COLUNAS_PRODUTO, COLUNAS_TEXTO
+
+def _linha_banco(registro):
+    # Converte um produto para a ordem/tipos das colunas persistidas
+    linha = [int(registro['id'])]
+    for c in COLUNAS_TEXTO:
+        v = registro.get(c)
+        linha.append("" if v is None or pd.isna(v) or str(v) == 'nan' else str(v))
+    for c in COLUNAS_NUMERICAS:
+        try: v = float(registro.get(c) or 0.0)
+        except (TypeError, ValueError): v = 0.0
+        linha.append(0.0 if pd.isna(v) else v)
+    return linha
+
+@contextmanager
+def _trava_arquivo(caminho):
+    # Trava exclusiva entre processos (várias instâncias do app no mesmo banco)
+    if fcntl is None:
+        yield
+        return
+    with open(caminho, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try: yield
+        finally: fcntl.flock(f, fcntl.LOCK_UN)
+
+class ArmazenamentoSQLite:
+    # Upsert/delete por id; cada operação é uma transação, então uma queda no meio não corrompe o banco (WAL).
+    # Toda escrita incrementa meta.versao na mesma transação, para outras sessões saberem que o banco mudou.
+    def __init__(self, caminho, csv_legado=None):
+        self.caminho = caminho
+        self.erro_migracao = None
+        with self._conectar() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            colunas = [f"{c} TEXT NOT NULL DEFAULT ''" for c in COLUNAS_TEXTO] + [f"{c} REAL NOT NULL DEFAULT 0" for c in COLUNAS_NUMERICAS]
+            conn.execute(f"CREATE TABLE IF NOT EXISTS produtos (id INTEGER PRIMARY KEY, {', '.join(colunas)})")
+            # Bancos criados antes de uma coluna nova (ex.: TipoAnuncio/Categoria) ganham a coluna com o valor padrão
+            existentes = {linha[1] for linha in conn.execute("PRAGMA table_info(produtos)")}
+            for c, definicao in zip(COLUNAS_PRODUTO[1:], colunas):
+                if c not in existentes: conn.execute(f"ALTER TABLE produtos ADD COLUMN {definicao}")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (chave TEXT PRIMARY KEY, valor TEXT)")
+        if csv_legado: self._migrar_csv(csv_legado)
+
+    def _conectar(self):
+        conn = sqlite3.connect(self.caminho, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _executar(self, fn):
+        conn = self._conectar()
+        try:
+            with conn: return fn(conn)
+        finally:
+            conn.close()
+
+    def _escrever(self, fn):
+        # BEGIN IMMEDIATE trava o banco antes de ler a versão: (antes, depois) não pula escritas de outro processo
+        def transacao(conn):
+            conn.execute("BEGIN IMMEDIATE")
+            antes = self._ler_versao(conn)
+            fn(conn)
+            conn.execute("INSERT INTO meta (chave, valor) VALUES ('versao', ?) ON CONFLICT(chave) DO UPDATE SET valor = excluded.valor",
+                         (str(antes + 1),))
+            return antes, antes + 1
+        return self._executar(transacao)
+
+    @staticmethod
+    def _ler_versao(conn):
+        linha = conn.execute("SELECT valor FROM meta WHERE chave = 'versao'").fetchone()
+        return int(linha[0]) if linha else 0
+
+    def versao(self): return self._executar(self._ler_versao)
+
+    def _migrar_csv(self, caminho_csv):
+        # Migração única do banco_dados.csv antigo; o CSV fica renomeado como backup.
+        # CSV ilegível não impede abrir o banco: fica em erro_migracao, o CSV fica intacto e a migração é tentada de novo
+        # na próxima abertura, mas só enquanto o banco estiver vazio (para não sobrescrever produtos cadastrados depois).
+        def migrar(conn):
+            if conn.execute("SELECT 1 FROM meta WHERE chave = 'migrado_csv'").fetchone(): return False
+            vazio = conn.execute("SELECT 1 FROM produtos LIMIT 1").fetchone() is None
+            if vazio and os.path.exists(caminho_csv) and os.path.getsize(caminho_csv) > 0:
+                df = pd.read_csv(caminho_csv)
+                if 'Produto' not in df.columns: raise ValueError(f"{caminho_csv} sem coluna 'Produto'")
+                self._upsert(conn, df.to_dict('records'))
+            conn.execute("INSERT INTO meta (chave, valor) VALUES ('migrado_csv', ?)", (datetime.now().isoformat(),))
+            return vazio and os.path.exists(caminho_csv)
+        try: migrado = self._executar(migrar)
+        except (OSError, ValueError) as e:
+            self.erro_migracao = f"{caminho_csv} não foi migrado: {e}"
+            print(f"Erro ao migrar: {self.erro_migracao}")
+            return
+        if migrado: os.replace(caminho_csv, caminho_csv + ".migrado")
+
+    def _upsert(self, conn, registros):
+        sets = ", ".join(f"{c} = excluded.{c}" for c in COLUNAS_PRODUTO[1:])
+        conn.executemany(f"INSERT INTO produtos ({', '.join(COLUNAS_PRODUTO)}) VALUES ({', '.join('?' * len(COLUNAS_PRODUTO))}) "
+                         f"ON CONFLICT(id) DO UPDATE SET {sets}", [_linha_banco(r) for r in registros])
+
+    def carregar(self):
+        def ler(conn):
+            cur = conn.execute(f"SELECT {', '.join(COLUNAS_PRODUTO)} FROM produtos ORDER BY id")
+            return [dict(zip(COLUNAS_PRODUTO, linha)) for linha in cur]
+        return self._executar(ler)
+
+    def gravar(self, registros, removidos=()):
+        def aplicar(conn):
+            if registros: self._upsert(conn, registros)
+            if removidos: conn.executemany("DELETE FROM produtos WHERE id = ?", [(int(i),) for i in removidos])
+        return self._escrever(aplicar)
+
+    def substituir(self, registros):
+        # Importação/limpeza: troca o catálogo inteiro em uma única transação
+        def aplicar(conn):
+            conn.execute("DELETE FROM produtos")
+            self._upsert(conn, registros)
+        return self._escrever(aplicar)
+
+class ArmazenamentoCSV:
+    # Backend legado: mantém as linhas em memória e regrava o arquivo inteiro (temp + rename) a cada alteração.
+    # A escrita acontece sob trava de arquivo; se outro processo mudou o CSV desde a última leitura,
+    # ele é relido antes e as alterações são aplicadas por cima, linha a linha.
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._linhas = {}
+        self._versao_lida = None
+        self._trava = threading.Lock()
+
+    def versao(self):
+        try: st = os.stat(self.caminho)
+        except FileNotFoundError: return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _ler(self):
+        versao = self.versao()
+        self._linhas = {}
+        if os.path.exists(self.caminho) and os.path.getsize(self.caminho) > 0:
+            df = pd.read_csv(self.caminho)
+            if 'Produto' not in df.columns: raise ValueError(f"{self.caminho} sem coluna 'Produto'")
+            for r in df.to_dict('records'):
+                linha = _linha_banco(r)
+                self._linhas[linha[0]] = linha
+        self._versao_lida = versao
+
+    def carregar(self):
+        with self._trava:
+            self._ler()
+            return [dict(zip(COLUNAS_PRODUTO, l)) for l in self._linhas.values()]
+
+    def _escrever(self):
+        if not self._linhas:
+            if os.path.exists(self.caminho): os.remove(self.caminho)
+        else:
+            tmp = f"{self.caminho}.{os.getpid()}.tmp"
+            pd.DataFrame(list(self._linhas.values()), columns=COLUNAS_PRODUTO).to_csv(tmp, index=False)
+            os.replace(tmp, self.caminho)
+        self._versao_lida = self.versao()
+
+    def gravar(self, registros, removidos=()):
+        with self._trava, _trava_arquivo(self.caminho + ".lock"):
+            antes = self.versao()
+            if antes != self._versao_lida: self._ler()
+            for r in registros:
+                linha = _linha_banco(r)
+                self._linhas[linha[0]] = linha
+            for i in removidos: self._linhas.pop(int(i), None)
+            self._escrever()
+            return antes, self._versao_lida
+
+    def substituir(self, registros):
+        with self._trava, _trava_arquivo(self.caminho + ".lock"):
+            antes = self.versao()
+            self._linhas = {}
+            for r in registros:
+                linha = _linha_banco(r)
+                self._linhas[linha[0]] = linha
+            self._escrever()
+            return antes, self._versao_lida
+
+class GravadorAdiado:
+    # Junta as gravações pedidas dentro de `janela` segundos (no máximo `espera_maxima`) e aplica numa thread de fundo,
+    # para que cada tecla nos inputs não vire uma escrita no disco. Compartilhado por todas as sessões do processo;
+    # `origem` identifica a sessão que pediu cada gravação.
+    def __init__(self, armazenamento, janela=0.5, espera_maxima=3.0):
+        self.armazenamento = armazenamento
+        self.janela = janela
+        self.espera_maxima = espera_maxima
+        self._cond = threading.Condition()
+        self._trava_gravacao = threading.Lock()
+        self._alterados = {}  # id -> registro, ou None para remover
+        self._substituir = None
+        self._origens = set()
+        self._em_gravacao = set()
+        self._prazo = self._limite = None
+        self._historico = deque(maxlen=1024)  # (versão antes, versão depois, origens) de cada gravação
+        self._ultimo_flush = {}
+        self.erro = None
+        threading.Thread(target=self._laco, daemon=True, name="gravador-precificador").start()
+
+    def agendar(self, registros=(), removidos=(), origem=None):
+        with self._cond:
+            for r in registros: self._alterados[int(r['id'])] = dict(r)
+            for i in removidos: self._alterados[int(i)] = None
+            self._marcar(origem)
+
+    def substituir(self, registros, origem=None):
+        with self._cond:
+            self._substituir = [dict(r) for r in registros]
+            self._alterados = {}
+            self._marcar(origem)
+
+    def _marcar(self, origem):
+        agora = time.monotonic()
+        if self._prazo is None: self._limite = agora + self.espera_maxima
+        self._prazo = min(agora + self.janela, self._limite)
+        self._origens.add(origem)
+        self._cond.notify()
+
+    def pendente(self, origem=None):
+        with self._cond:
+            origens = self._origens | self._em_gravacao
+            return bool(origens) if origem is None else origem in origens
+
+    def ultimo_flush(self, origem=None):
+        with self._cond: return self._ultimo_flush.get(origem)
+
+    def versao_apos(self, versao, origem):
+        # Avança a versão conhecida pela sessão pelas gravações que só ela fez; outra origem no caminho = banco mudou
+        with self._cond:
+            for antes, depois, origens in self._historico:
+                if antes == versao and origens == {origem}: versao = depois
+        return versao
+
+    def _laco(self):
+        while True:
+            with self._cond:
+                while self._prazo is None or self._prazo > time.monotonic():
+                    self._cond.wait(None if self._prazo is None else self._prazo - time.monotonic())
+            self.descarregar()
+
+    def descarregar(self):
+        # Grava o que estiver pendente agora, na thread de quem chamou (salvar já / encerramento do processo)
+        with self._trava_gravacao:
+            with self._cond:
+                if self._prazo is None: return
+                substituir, alterados, origens = self._substituir, self._alterados, self._origens
+                self._substituir, self._alterados, self._origens = None, {}, set()
+                self._prazo = self._limite = None
+                self._em_gravacao = origens
+            try:
+                versoes = None
+                if substituir is not None:
+                    versoes = self.armazenamento.substituir(substituir)
+                    substituir = None
+                registros = [r for r in alterados.values() if r is not None]
+                removidos = [i for i, r in alterados.items() if r is None]
+                if registros or removidos:
+                    antes, depois = self.armazenamento.gravar(registros, removidos)
+                    # Outro processo escreveu entre as duas transações: a sequência não é só deste lote
+                    versoes = (antes, depois) if versoes is None else (versoes[0], depois) if versoes[1] == antes else None
+            except Exception as e:
+                print(f"Erro ao salvar: {e}")
+                with self._cond:
+                    # Devolve o lote para a fila (o que chegou depois tem prioridade) e tenta de novo mais tarde
+                    # (um substituir novo descarta o lote que falhou)
+                    if self._substituir is None:
+                        self._substituir = substituir
+                        self._alterados = {**alterados, **self._alterados}
+                    self._origens |= origens
+                    self._em_gravacao = set()
+                    self._prazo = self._limite = time.monotonic() + self.espera_maxima
+                    self.erro = e
+                    self._cond.notify()
+                return
+            with self._cond:
+                if versoes: self._historico.append((versoes[0], versoes[1], frozenset(origens)))
+                agora = datetime.now()
+                for o in origens: self._ultimo_flush[o] = agora
+                self._em_gravacao = set()
+                self.erro = None
@@ -0,0 +1,574 @@
+# Catálogo em memória: produtos em colunas indexados por id/MLB/SKU e índice de busca incremental
+import bisect
+import itertools
+import re
+import threading
+import time
+import unicodedata
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from .precos import COLUNAS_NUMERICAS, COLUNAS_PRODUTO, COLUNAS_TEXTO, tabela_produtos
+
+_RE_NAO_ALFANUM = re.compile(r'[^a-z0-9]+')
+
+def _normalizar_busca(texto):
+    texto = str(texto or "")
+    if not texto.isascii(): texto = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode()
+    return _RE_NAO_ALFANUM.sub(' ', texto.lower()).split()
+
+def _normalizar_serie(textos):
+    # Versão em lote de _normalizar_busca: tokens de cada texto unidos por um espaço
+    s = pd.Series(textos, dtype=object).fillna("").astype(str)
+    acentuado = ~s.map(str.isascii).to_numpy(bool)
+    if acentuado.any(): s[acentuado] = s[acentuado].str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii')
+    return s.str.lower().str.replace(_RE_NAO_ALFANUM.pattern, ' ', regex=True).str.strip().tolist()
+
+def _ngrama(g):
+    # Bigrama/trigrama como inteiro, um byte por caractere (mesma conta da matriz de caracteres em IndiceBusca._reconstruir)
+    n = 0
+    for c in g: n = (n << 8) | ord(c)
+    return n
+
+def _bit(c):
+    # Posição do caractere [0-9a-z] na máscara de caracteres dos códigos
+    return ord(c) - 48 if c <= '9' else ord(c) - 87
+
+class _Postagens:
+    # chave -> slots. A base é compacta (chaves ordenadas e os slots de cada chave contíguos, montada em lote) e o que
+    # entra depois fica num delta pequeno até a próxima reconstrução. As consultas marcam os slots numa máscara.
+    def __init__(self):
+        self.reconstruir([], [])
+
+    def reconstruir(self, chaves, slots):
+        # chaves/slots alinhados: um par por ocorrência
+        if isinstance(chaves, np.ndarray):
+            codigos, unicas = pd.factorize(chaves, sort=True)
+            self._chaves = unicas.tolist()
+        else:
+            # Texto: o sorted do Python ordena as chaves únicas bem mais rápido que o argsort de objetos do NumPy
+            codigos, unicas = pd.factorize(np.asarray(chaves, dtype=object))
+            self._chaves = sorted(unicas.tolist())
+            posicao = dict(zip(self._chaves, range(len(self._chaves))))
+            codigos = np.fromiter(map(posicao.__getitem__, unicas.tolist()), np.int64, len(unicas))[codigos]
+        self._inicio = np.concatenate([[0], np.cumsum(np.bincount(codigos, minlength=len(unicas)))]).astype(np.int64)
+        self._slots = np.asarray(slots, np.int64)[np.argsort(codigos)]
+        self._delta, self._delta_ordenado, self.tamanho_delta = {}, [], 0
+
+    def adicionar(self, chave, slot):
+        if chave not in self._delta:
+            self._delta[chave] = []
+            self._delta_ordenado = None
+        self._delta[chave].append(slot)
+        self.tamanho_delta += 1
+
+    def marcar(self, mascara, chave, prefixo=False):
+        # Prefixo só para chaves de texto, que só têm [a-z0-9]: tudo que começa com `chave` fica antes de chave + "{"
+        i = bisect.bisect_left(self._chaves, chave)
+        if prefixo: j = bisect.bisect_left(self._chaves, chave + "{", i)
+        else: j = i + 1 if i < len(self._chaves) and self._chaves[i] == chave else i
+        mascara[self._slots[self._inicio[i]:self._inicio[j]]] = True
+        if not prefixo:
+            if chave in self._delta: mascara[self._delta[chave]] = True
+            return mascara
+        if self._delta_ordenado is None: self._delta_ordenado = sorted(self._delta)
+        i = bisect.bisect_left(self._delta_ordenado, chave)
+        while i < len(self._delta_ordenado) and self._delta_ordenado[i].startswith(chave):
+            mascara[self._delta[self._delta_ordenado[i]]] = True
+            i += 1
+        return mascara
+
+class IndiceBusca:
+    # Índice de busca: tokens do nome e dos códigos (busca por prefixo), primeiro token do nome e bigramas/trigramas dos
+    # códigos MLB/SKU para achar pedaços de código ("12345" em "MLB-123456"). Cada produto ocupa um slot; candidatos e
+    # pontuação são máscaras/arrays NumPy sobre os slots e o desempate (nome mais curto, depois id maior) é uma ordem
+    # pré-calculada, então o top-k sai de um argpartition, sem pontuar produto por produto em Python.
+    # Cargas e lotes grandes reconstroem as postagens de uma vez; acréscimos pequenos vão para o delta das postagens.
+    LIMITE_DELTA = 20000
+
+    def __init__(self):
+        self.limpar()
+
+    def limpar(self):
+        self._slot = {}
+        self._ids, self._vivo = np.zeros(0, np.int64), np.zeros(0, bool)
+        self._caracteres = np.zeros(0, np.int64)  # por slot: bits dos caracteres que aparecem nos códigos
+        self._nomes, self._mlbs, self._skus = [], [], []  # por slot, já normalizados
+        self._n = self._mortos = 0
+        self._tokens, self._primeiros, self._codigos, self._ngramas = _Postagens(), _Postagens(), _Postagens(), _Postagens()
+        self._posto = None
+
+    def _reservar(self, k):
+        if self._n + k > len(self._ids):
+            capacidade = max(1024, 2 * len(self._ids), self._n + k)
+            def maior(a):
+                novo = np.zeros(capacidade, a.dtype)
+                novo[:self._n] = a[:self._n]
+                return novo
+            self._ids, self._vivo, self._caracteres = maior(self._ids), maior(self._vivo), maior(self._caracteres)
+        inicio = self._n
+        self._n += k
+        self._posto = None
+        return inicio
+
+    def adicionar(self, registro):
+        self.adicionar_lote([registro['id']], [registro.get('Produto')], [registro.get('MLB')], [registro.get('SKU')])
+
+    def adicionar_lote(self, ids, produtos, mlbs, skus):
+        ids = [int(i) for i in ids]
+        for i in ids: self.remover(i)
+        if not ids: return
+        # Índice vazio ou lote grande em relação a ele: reconstruir sai mais barato que o delta linha a linha
+        reconstruir = (not self._slot or len(ids) > max(1024, len(self._slot) // 8)
+                       or self._tokens.tamanho_delta + len(ids) > self.LIMITE_DELTA)
+        if len(ids) > 100: nomes, mlbs, skus = _normalizar_serie(produtos), _normalizar_serie(mlbs), _normalizar_serie(skus)
+        else: nomes, mlbs, skus = ([" ".join(_normalizar_busca(t)) for t in textos] for textos in (produtos, mlbs, skus))
+        inicio = self._reservar(len(ids))
+        self._ids[inicio:self._n], self._vivo[inicio:self._n] = ids, True
+        self._slot.update(zip(ids, range(inicio, self._n)))
+        self._nomes.extend(nomes)
+        self._mlbs.extend(mlbs)
+        self._skus.extend(skus)
+        if reconstruir:
+            self._reconstruir()
+            return
+        for slot, nome, mlb, sku in zip(range(inicio, self._n), nomes, mlbs, skus):
+            palavras = nome.split()
+            for t in set(palavras).union(mlb.split(), sku.split()): self._tokens.adicionar(t, slot)
+            if palavras: self._primeiros.adicionar(palavras[0], slot)
+            for c in {mlb.replace(" ", ""), sku.replace(" ", "")} - {""}:
+                self._codigos.adicionar(c, slot)
+                for g in {_ngrama(c[i:i + n]) for n in (2, 3) for i in range(len(c) - n + 1)}: self._ngramas.adicionar(g, slot)
+                for letra in set(c): self._caracteres[slot] |= 1 << _bit(letra)
+
+    def remover(self, id_produto):
+        slot = self._slot.pop(id_produto, None)
+        if slot is None: return
+        # Só marca o slot; as postagens dele somem na próxima reconstrução
+        self._vivo[slot] = False
+        self._mortos += 1
+        if self._mortos > max(self.LIMITE_DELTA, len(self._slot)): self._reconstruir()
+
+    def _reconstruir(self):
+        # Compacta os slots vivos e remonta todas as postagens de uma vez
+        vivos = np.flatnonzero(self._vivo[:self._n])
+        ids = self._ids[vivos]
+        nomes, mlbs, skus = ([textos[i] for i in vivos.tolist()] for textos in (self._nomes, self._mlbs, self._skus))
+        self.limpar()
+        self._reservar(len(ids))
+        self._ids[:self._n], self._vivo[:self._n] = ids, True
+        self._slot = dict(zip(ids.tolist(), range(len(ids))))
+        self._nomes, self._mlbs, self._skus = nomes, mlbs, skus
+        slots = np.arange(len(ids))
+
+        def pares(textos):
+            # Textos com os tokens separados por um espaço -> (tokens, slot de cada token)
+            tamanhos = np.fromiter((t.count(" ") + 1 if t else 0 for t in textos), np.int64, len(textos))
+            return " ".join(textos).split(), np.repeat(slots, tamanhos)
+        # Repetições (token no nome e no código, trigrama repetido) não mudam as máscaras, então ficam
+        tokens = [pares(textos) for textos in (nomes, mlbs, skus)]
+        self._tokens.reconstruir(list(itertools.chain.from_iterable(t for t, _ in tokens)), np.concatenate([s for _, s in tokens]))
+        primeiros = [t.partition(" ")[0] for t in nomes]
+        tem_nome = np.array([bool(t) for t in primeiros], bool)
+        self._primeiros.reconstruir([t for t in primeiros if t], slots[tem_nome])
+        codigos = [t.replace(" ", "") for t in mlbs] + [t.replace(" ", "") for t in skus]
+        cheio = np.array([bool(c) for c in codigos], bool)
+        codigos, slots_codigo = [c for c in codigos if c], np.concatenate([slots, slots])[cheio]
+        self._codigos.reconstruir(codigos, slots_codigo)
+        # Bigramas/trigramas como inteiros e a máscara de caracteres a partir da matriz de caracteres (zeros depois do
+        # fim de cada código), em blocos de códigos de tamanho parecido
+        tamanhos = np.fromiter(map(len, codigos), np.int64, len(codigos))
+        ordem = np.argsort(tamanhos, kind='stable')
+        gramas, slots_grama = [np.zeros(0, np.int64)], [np.zeros(0, np.int64)]
+        for bloco in np.array_split(ordem, max(1, len(ordem) // 20000)):
+            largura = int(tamanhos[bloco].max(initial=0))
+            if largura == 0: continue
+            m = np.array([codigos[i] for i in bloco.tolist()], dtype=f'U{largura}').view(np.uint32).reshape(len(bloco), largura).astype(np.int64)
+            bits = np.where(m != 0, np.left_shift(1, np.where(m >= 97, m - 87, m - 48)), 0)
+            np.bitwise_or.at(self._caracteres, slots_codigo[bloco], np.bitwise_or.reduce(bits, axis=1))
+            for g, valido in (((m[:, :-1] << 8) | m[:, 1:], m[:, 1:] != 0),
+                              ((m[:, :-2] << 16) | (m[:, 1:-1] << 8) | m[:, 2:], m[:, 2:] != 0)):
+                gramas.append(g[valido])
+                slots_grama.append(np.broadcast_to(slots_codigo[bloco][:, None], g.shape)[valido])
+        self._ngramas.reconstruir(np.concatenate(gramas), np.concatenate(slots_grama))
+
+    def _ordem(self):
+        # Posto de desempate de cada slot (maior = melhor): nome mais curto, depois id maior
+        if self._posto is None:
+            tamanhos = np.fromiter(map(len, self._nomes), np.int64, self._n)
+            self._posto = np.empty(self._n, np.int64)
+            self._posto[np.lexsort((self._ids[:self._n], -tamanhos))] = np.arange(self._n)
+        return self._posto
+
+    def _mascara(self): return np.zeros(self._n, bool)
+
+    def _por_trecho_codigo(self, termo):
+        # Slots com o termo dentro de um código: 1 letra pela máscara de caracteres, 2 pelo bigrama, 3+ por todos os
+        # trigramas (com mais de 3 letras ainda falta conferir se o trecho é contíguo)
+        if len(termo) == 1: return (self._caracteres[:self._n] >> _bit(termo)) & 1 == 1
+        if len(termo) == 2: return self._ngramas.marcar(self._mascara(), _ngrama(termo))
+        mascara = None
+        for g in {_ngrama(termo[i:i + 3]) for i in range(len(termo) - 2)}:
+            m = self._ngramas.marcar(self._mascara(), g)
+            mascara = m if mascara is None else mascara & m
+        return mascara
+
+    def _conferir(self, slot, termos, consulta_cod):
+        # Conferência exata de um slot: (casa todos os termos, consulta_cod aparece dentro de um código)
+        nome, mlb, sku = self._nomes[slot], self._mlbs[slot], self._skus[slot]
+        tokens = set(nome.split()).union(mlb.split(), sku.split())
+        codigos = [c for c in (mlb.replace(" ", ""), sku.replace(" ", "")) if c]
+        casa = all(any(t.startswith(termo) for t in tokens) or (len(termo) >= 3 and any(termo in c for c in codigos)) for termo in termos)
+        return casa, any(consulta_cod in c for c in codigos)
+
+    def buscar(self, consulta, k=20):
+        # Retorna até k ids, do melhor para o pior casamento
+        termos = _normalizar_busca(consulta)
+        if not termos or not self._slot or k <= 0: return []
+        candidatos, a_conferir = self._vivo[:self._n].copy(), self._mascara()
+        for termo in termos:
+            # Trecho de código só conta para achar o produto com 3+ letras (na pontuação, vale qualquer tamanho)
+            por_prefixo = self._tokens.marcar(self._mascara(), termo, prefixo=True)
+            por_trecho = self._por_trecho_codigo(termo) if len(termo) >= 3 else self._mascara()
+            if len(termo) > 3: a_conferir |= por_trecho & ~por_prefixo
+            candidatos &= por_prefixo | por_trecho
+            if not candidatos.any(): return []
+        consulta_cod = "".join(termos)
+        exato = self._codigos.marcar(self._mascara(), consulta_cod)
+        prefixo_cod = self._codigos.marcar(self._mascara(), consulta_cod, prefixo=True)
+        trecho_cod = self._por_trecho_codigo(consulta_cod) & ~prefixo_cod
+        # Mesma pontuação de sempre: código exato 100, prefixo de código 50, trecho de código 25,
+        # +10 por termo que é um token inteiro, +5 se o nome começa pelo primeiro termo
+        pontos = np.where(exato, 100, np.where(prefixo_cod, 50, np.where(trecho_cod, 25, 0)))
+        for termo in termos: pontos += 10 * self._tokens.marcar(self._mascara(), termo)
+        pontos += 5 * self._primeiros.marcar(self._mascara(), termos[0], prefixo=True)
+        if len(consulta_cod) > 3: a_conferir |= trecho_cod
+        cand = np.flatnonzero(candidatos)
+        escala = self._n + 1
+        chave = pontos[cand].astype(np.int64) * escala + self._ordem()[cand]
+        pendente = a_conferir[cand]
+        while True:
+            if len(cand) > k: topo = np.argpartition(-chave, k - 1)[:k]
+            else: topo = np.arange(len(cand))
+            topo = topo[np.argsort(-chave[topo], kind='stable')]
+            topo = topo[chave[topo] >= 0]
+            falta = topo[pendente[topo]]
+            if not len(falta): return self._ids[cand[topo]].tolist()
+            # Só os pendentes que chegaram ao top-k são conferidos; quem não casa sai ou perde os 25 do trecho
+            for j in falta.tolist():
+                pendente[j] = False
+                casa, trecho = self._conferir(int(cand[j]), termos, consulta_cod)
+                if not casa: chave[j] = -1
+                elif trecho_cod[cand[j]] and not trecho: chave[j] -= 25 * escala
+
+class CatalogoProdutos:
+    # Catálogo em colunas (struct-of-arrays): números em arrays float64 e textos codificados por dicionário
+    # (códigos int32 + lista de categorias), com índices por id/MLB/SKU e o índice de busca.
+    # Feito para existir uma vez por processo e ser lido por todas as sessões: `instantaneo()` entrega views das
+    # colunas, sem cópia. Escritas passam por `trava`; um array já entregue a um leitor é copiado antes de mudar
+    # (copy-on-write), então uma tabela entregue nunca muda por baixo de quem leu.
+    # (uid, versao) identifica o conteúdo atual e serve de chave para caches derivados do catálogo.
+    def __init__(self, registros=()):
+        self.uid = uuid.uuid4().hex
+        self.versao = 0
+        self.trava = threading.RLock()
+        self._ultimo_id = 0
+        self.indice_busca = IndiceBusca()
+        self._zerar()
+        self.adicionar_lote(registros)
+
+    def _zerar(self, capacidade=1024):
+        self._n = self._mortos = 0
+        self._ids = np.zeros(capacidade, np.int64)
+        self._vivo = np.zeros(capacidade, bool)
+        self._num = {c: np.zeros(capacidade) for c in COLUNAS_NUMERICAS}
+        self._cod = {c: np.zeros(capacidade, np.int32) for c in COLUNAS_TEXTO}
+        self._categorias = {c: [""] for c in COLUNAS_TEXTO}
+        self._codigo_de = {c: {"": 0} for c in COLUNAS_TEXTO}
+        self._indices_categoria = {}
+        self._compartilhados = set()
+        self._instantaneo = None
+        self._pos = {}
+        self._por_mlb = {}
+        self._por_sku = {}
+
+    # --- leitura ---
+    def __len__(self): return len(self._pos)
+    def __iter__(self): return iter(self.registros())
+    def __contains__(self, id_produto): return id_produto in self._pos
+
+    def instantaneo(self):
+        # (versao, DataFrame) consistentes entre si; refeito só quando a versão muda
+        with self.trava:
+            if self._instantaneo is None or self._instantaneo[0] != self.versao:
+                if self._mortos: self._compactar()
+                n = self._n
+                dados = {'id': self._ids[:n]}
+                for c in COLUNAS_TEXTO:
+                    if c not in self._indices_categoria: self._indices_categoria[c] = pd.Index(self._categorias[c])
+                    dados[c] = pd.Categorical.from_codes(self._cod[c][:n], categories=self._indices_categoria[c], validate=False)
+                for c in COLUNAS_NUMERICAS: dados[c] = self._num[c][:n]
+                self._compartilhados.update(COLUNAS_PRODUTO[1:])
+                self._instantaneo = (self.versao, pd.DataFrame(dados, copy=False))
+            return self._instantaneo
+
+    def tabela(self, ids=None):
+        with self.trava:
+            df = self.instantaneo()[1]
+            if ids is None: return df
+            return df.iloc[[self._pos[i] for i in ids if i in self._pos]]
+
+    def ids(self):
+        return self.instantaneo()[1]['id'].to_numpy()
+
+    def _registro(self, p):
+        registro = {'id': int(self._ids[p])}
+        for c in COLUNAS_TEXTO: registro[c] = self._categorias[c][self._cod[c][p]]
+        for c in COLUNAS_NUMERICAS: registro[c] = float(self._num[c][p])
+        return registro
+
+    def registros(self):
+        df = self.instantaneo()[1]
+        colunas = [df['id'].tolist()] + [df[c].astype(str).tolist() for c in COLUNAS_TEXTO] + [df[c].tolist() for c in COLUNAS_NUMERICAS]
+        return [dict(zip(COLUNAS_PRODUTO, linha)) for linha in zip(*colunas)]
+
+    def obter(self, id_produto):
+        # Cópia da linha como dict; alterações voltam pelo `atualizar`
+        with self.trava:
+            p = self._pos.get(id_produto)
+            return None if p is None else self._registro(p)
+
+    def buscar(self, consulta, k=20):
+        with self.trava: return self.indice_busca.buscar(consulta, k)
+
+    def por_mlb(self, mlb):
+        with self.trava: return [self._registro(self._pos[i]) for i in self._por_mlb.get(str(mlb).strip(), ())]
+    def por_sku(self, sku):
+        with self.trava: return [self._registro(self._pos[i]) for i in self._por_sku.get(str(sku).strip(), ())]
+
+    # Chave -> ids em ordem crescente (o primeiro é o mais antigo) para casar lotes inteiros de uma vez
+    def mapa_mlb(self):
+        with self.trava: return {k: tuple(sorted(v)) for k, v in self._por_mlb.items()}
+    def mapa_sku(self, sem_mlb=False):
+        # sem_mlb: só produtos sem MLB (os com MLB são casados pelo próprio MLB)
+        with self.trava:
+            if not sem_mlb: return {k: tuple(sorted(v)) for k, v in self._por_sku.items()}
+            mlbs, cod = self._categorias['MLB'], self._cod['MLB']
+            mapa = {k: tuple(sorted(i for i in v if not mlbs[cod[self._pos[i]]].strip())) for k, v in self._por_sku.items()}
+            return {k: v for k, v in mapa.items() if v}
+
+    # --- escrita (sempre sob a trava) ---
+    def novo_id(self):
+        # Mantém o padrão de id em milissegundos, sem colidir com itens criados no mesmo instante
+        with self.trava:
+            self._ultimo_id = max(int(time.time()*1000), self._ultimo_id + 1)
+            return self._ultimo_id
+
+    def reservar_ids(self, n):
+        # Bloco de n ids consecutivos para importações em lote; retorna o primeiro
+        with self.trava:
+            inicio = self.novo_id()
+            self._ultimo_id = inicio + max(n, 1) - 1
+            return inicio
+
+    def _gravavel(self, nome, atual):
+        # Copia o array se um leitor recebeu view dele desde a última cópia
+        if nome not in self._compartilhados: return atual
+        self._compartilhados.discard(nome)
+        return atual.copy()
+
+    def _area_livre(self, k):
+        # Append na área livre dos arrays: fora das views já entregues, então não precisa copiar
+        if self._n + k > len(self._ids): self._crescer(self._n + k)
+        return self._n
+
+    def _crescer(self, minimo=0):
+        capacidade = max(1024, 2 * len(self._ids), minimo)
+        def maior(a):
+            novo = np.zeros(capacidade, a.dtype)
+            novo[:self._n] = a[:self._n]
+            return novo
+        self._ids, self._vivo = maior(self._ids), maior(self._vivo)
+        self._num = {c: maior(a) for c, a in self._num.items()}
+        self._cod = {c: maior(a) for c, a in self._cod.items()}
+        self._compartilhados.clear()
+
+    def _compactar(self):
+        # Remove as linhas apagadas (novos arrays: views antigas continuam válidas)
+        manter = np.flatnonzero(self._vivo[:self._n])
+        capacidade = max(1024, len(self._ids))
+        def compacto(a):
+            novo = np.zeros(capacidade, a.dtype)
+            novo[:len(manter)] = a[manter]
+            return novo
+        self._ids, self._vivo = compacto(self._ids), compacto(self._vivo)
+        self._num = {c: compacto(a) for c, a in self._num.items()}
+        self._cod = {c: compacto(a) for c, a in self._cod.items()}
+        self._n, self._mortos = len(manter), 0
+        self._pos = {i: p for p, i in enumerate(self._ids[:self._n].tolist())}
+        self._compartilhados.clear()
+
+    def _codigo(self, coluna, valor):
+        texto = "" if valor is None or (isinstance(valor, float) and np.isnan(valor)) else str(valor)
+        if texto == "nan": texto = ""
+        codigo = self._codigo_de[coluna].get(texto)
+        if codigo is None:
+            codigo = self._codigo_de[coluna][texto] = len(self._categorias[coluna])
+            self._categorias[coluna].append(texto)
+            self._indices_categoria.pop(coluna, None)
+        return codigo
+
+    @staticmethod
+    def _numero(valor):
+        try: v = float(valor if valor is not None else 0.0)
+        except (TypeError, ValueError): return 0.0
+        return 0.0 if np.isnan(v) else v
+
+    def _indexar(self, registro):
+        for indice, campo in ((self._por_mlb, 'MLB'), (self._por_sku, 'SKU')):
+            chave = str(registro.get(campo) or "").strip()
+            if chave: indice.setdefault(chave, set()).add(registro['id'])
+
+    def _desindexar(self, registro):
+        for indice, campo in ((self._por_mlb, 'MLB'), (self._por_sku, 'SKU')):
+            chave = str(registro.get(campo) or "").strip()
+            ids = indice.get(chave)
+            if ids is not None:
+                ids.discard(registro['id'])
+                if not ids: del indice[chave]
+
+    def adicionar(self, registro):
+        with self.trava:
+            id_produto = registro.get('id')
+            if id_produto is None or pd.isna(id_produto) or int(id_produto) in self._pos: id_produto = self.novo_id()
+            id_produto = int(id_produto)
+            self._ultimo_id = max(self._ultimo_id, id_produto)
+            p = self._area_livre(1)
+            self._ids[p], self._vivo[p] = id_produto, True
+            for c in COLUNAS_TEXTO: self._cod[c][p] = self._codigo(c, registro.get(c))
+            for c in COLUNAS_NUMERICAS: self._num[c][p] = self._numero(registro.get(c))
+            self._n += 1
+            self._pos[id_produto] = p
+            novo = self._registro(p)
+            self._indexar(novo)
+            self.indice_busca.adicionar(novo)
+            self.versao += 1
+            return novo
+
+    def adicionar_lote(self, registros):
+        # Carga em lote (banco, importação): colunas convertidas de uma vez; só os índices são por linha
+        registros = list(registros)
+        if not registros: return []
+        with self.trava:
+            df = tabela_produtos(registros)
+            ids = pd.to_numeric(df['id'], errors='coerce')
+            novo = (ids.isna() | ids.duplicated() | ids.isin(list(self._pos))).to_numpy()
+            if novo.any(): ids[novo] = self.reservar_ids(int(novo.sum())) + np.arange(int(novo.sum()))
+            ids = ids.astype('int64').to_numpy()
+            self._ultimo_id = max(self._ultimo_id, int(ids.max()))
+            k = len(ids)
+            inicio = self._area_livre(k)
+            faixa = slice(inicio, inicio + k)
+            self._ids[faixa], self._vivo[faixa] = ids, True
+            for c in COLUNAS_NUMERICAS: self._num[c][faixa] = df[c].to_numpy(float)
+            textos = {}
+            for c in COLUNAS_TEXTO:
+                # Textos já normalizados por tabela_produtos: só os valores ainda sem código entram no dicionário
+                codigos, unicos = pd.factorize(df[c].to_numpy(object))
+                unicos, codigo_de = unicos.tolist(), self._codigo_de[c]
+                novos = [u for u in unicos if u not in codigo_de]
+                if novos:
+                    codigo_de.update(zip(novos, range(len(self._categorias[c]), len(self._categorias[c]) + len(novos))))
+                    self._categorias[c].extend(novos)
+                    self._indices_categoria.pop(c, None)
+                self._cod[c][faixa] = np.array([codigo_de[u] for u in unicos], np.int32)[codigos]
+                textos[c] = df[c].tolist()
+            self._n += k
+            lista_ids = ids.tolist()
+            self._pos.update(zip(lista_ids, range(inicio, inicio + k)))
+            for indice, campo in ((self._por_mlb, 'MLB'), (self._por_sku, 'SKU')):
+                for chave, i in zip(df[campo].str.strip().tolist(), lista_ids):
+                    if not chave: continue
+                    ids_chave = indice.get(chave)
+                    if ids_chave is None: indice[chave] = {i}
+                    else: ids_chave.add(i)
+            self.indice_busca.adicionar_lote(lista_ids, textos['Produto'], textos['MLB'], textos['SKU'])
+            self.versao += 1
+            return lista_ids
+
+    def atualizar(self, id_produto, campos):
+        with self.trava:
+            p = self._pos.get(id_produto)
+            if p is None: return None
+            reindexar = 'MLB' in campos or 'SKU' in campos or 'Produto' in campos
+            if reindexar:
+                anterior = self._registro(p)
+                self._desindexar(anterior)
+                self.indice_busca.remover(id_produto)
+            for c, v in campos.items():
+                if c in self._num:
+                    self._num[c] = self._gravavel(c, self._num[c])
+                    self._num[c][p] = self._numero(v)
+                elif c in self._cod:
+                    self._cod[c] = self._gravavel(c, self._cod[c])
+                    self._cod[c][p] = self._codigo(c, v)
+            registro = self._registro(p)
+            if reindexar:
+                self._indexar(registro)
+                self.indice_busca.adicionar(registro)
+            self.versao += 1
+            return registro
+
+    def atualizar_lote(self, ids, colunas):
+        # Edição em massa: {campo: valores alinhados com ids}; números atribuídos de uma vez, uma versão nova só
+        with self.trava:
+            manter = [k for k, i in enumerate(ids) if int(i) in self._pos]
+            ids = [int(ids[k]) for k in manter]
+            if not ids: return []
+            pos = np.array([self._pos[i] for i in ids])
+            reindexar = any(c in colunas for c in ('MLB', 'SKU', 'Produto'))
+            if reindexar:
+                for i, p in zip(ids, pos.tolist()):
+                    self._desindexar(self._registro(p))
+                    self.indice_busca.remover(i)
+            for c, valores in colunas.items():
+                valores = np.asarray(valores, dtype=object)[manter]
+                if c in self._num:
+                    self._num[c] = self._gravavel(c, self._num[c])
+                    self._num[c][pos] = pd.to_numeric(pd.Series(valores), errors='coerce').fillna(0.0).to_numpy(float)
+                elif c in self._cod:
+                    self._cod[c] = self._gravavel(c, self._cod[c])
+                    self._cod[c][pos] = [self._codigo(c, v) for v in valores]
+            if reindexar:
+                registros = [self._registro(p) for p in pos.tolist()]
+                for registro in registros: self._indexar(registro)
+                self.indice_busca.adicionar_lote(ids, *([r[c] for r in registros] for c in ('Produto', 'MLB', 'SKU')))
+            self.versao += 1
+            return ids
+
+    def remover(self, id_produto):
+        with self.trava:
+            p = self._pos.pop(id_produto, None)
+            if p is None: return None
+            registro = self._registro(p)
+            # Só marca a linha; a compactação acontece no próximo instantâneo (o snapshot atual não a vê mudar)
+            self._vivo[p] = False
+            self._mortos += 1
+            self._desindexar(registro)
+            self.indice_busca.remover(id_produto)
+            self.versao += 1
+            return registro
+
+    def limpar(self):
+        with self.trava:
+            self._zerar()
+            self.indice_busca.limpar()
+            self.versao += 1
+
+    def substituir(self, registros):
+        # Troca o conteúdo inteiro (recarga do banco / importação) sem que leitores vejam o meio do caminho
+        with self.trava:
+            self.limpar()
+            self.adicionar_lote(registros)
@@ -0,0 +1,84 @@
+# Simulação "e se": o catálogo precificado avaliado numa grade de cenários (imposto, comissão, desconto, tabela de frete)
+# numa conta vetorizada (cenários x produtos), em blocos de cenários para limitar a memória
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from .precos import MARGEM_ATENCAO, MARGEM_CRITICA, _fretes, _linhas_categoria, comissao_efetiva
+
+# Faixas de margem % do histograma de cada cenário
+BORDAS_MARGEM = np.array([-20.0, -10.0, 0.0, MARGEM_CRITICA, MARGEM_ATENCAO, 25.0, 40.0])
+ROTULOS_MARGEM = ["< -20%", "-20 a -10%", "-10 a 0%", f"0 a {MARGEM_CRITICA:g}%", f"{MARGEM_CRITICA:g} a {MARGEM_ATENCAO:g}%",
+                  f"{MARGEM_ATENCAO:g} a 25%", "25 a 40%", "≥ 40%"]
+
+def grade_cenarios(impostos, deltas_taxa, deltas_desconto, variantes_frete):
+    # Produto cartesiano dos parâmetros; `variantes_frete` são os nomes das tabelas de frete simuladas
+    return pd.DataFrame(list(itertools.product(impostos, deltas_taxa, deltas_desconto, variantes_frete)),
+                        columns=['Imposto', 'DeltaTaxa', 'DeltaDesconto', 'Frete'])
+
+def distribuicao_margem(margem):
+    # Contagem por faixa de margem; aceita (n,) ou (k, n) -> uma linha por cenário
+    margem = np.atleast_2d(margem)
+    k, nb = margem.shape[0], len(BORDAS_MARGEM) + 1
+    idx = np.searchsorted(BORDAS_MARGEM, margem, side='right') + np.arange(k)[:, None] * nb
+    return np.bincount(idx.ravel(), minlength=k * nb).reshape(k, nb)
+
+def _base(df, tabela_frete, delta_desconto):
+    # Parte do cálculo que só depende do desconto e da tabela de frete: preço de venda, custos fixos e comissão atual
+    desconto = np.clip(df['DescontoPct'].to_numpy(float) + delta_desconto, 0.0, 100.0)
+    pf = df['PrecoBase'].to_numpy(float) * (1 - desconto / 100)
+    faixa = np.searchsorted(tabela_frete["limites"], pf, side='right')
+    linha = _linhas_categoria(tabela_frete, df['Categoria'] if 'Categoria' in df else None, len(df))
+    frete, _ = _fretes(tabela_frete, faixa, linha, df['FreteManual'].to_numpy(float))
+    custos = frete + df['CMV'].to_numpy(float) + df['Extra'].to_numpy(float) - df['Bonus'].to_numpy(float)
+    taxa = comissao_efetiva(tabela_frete, df['TipoAnuncio'] if 'TipoAnuncio' in df else None, df['TaxaML'].to_numpy(float))
+    return pf, custos, taxa
+
+def _avaliar(base, imposto, delta_taxa):
+    # Mesma conta de calcular_precos; imposto/delta escalares ou colunas (k, 1) -> arrays (k, n)
+    pf, custos, taxa = base
+    lucro = pf * (1 - (imposto + np.maximum(taxa + delta_taxa, 0.0)) / 100) - custos
+    with np.errstate(divide='ignore', invalid='ignore'):
+        margem = np.where(pf > 0, lucro / pf * 100, 0.0)
+    return lucro, margem
+
+def simular_cenarios(df_calc, grade, tabelas_frete, celulas_por_bloco=4_000_000):
+    # df_calc: saída de calcular_precos (a situação atual é a referência dos "novos críticos")
+    # grade: saída de grade_cenarios; tabelas_frete: {nome da variante: tabela compilada}
+    # Devolve o resumo por cenário e a distribuição de margem (cenários x faixas de ROTULOS_MARGEM)
+    n = len(df_calc)
+    critico_atual = df_calc['MargemVenda'].to_numpy(float) < MARGEM_CRITICA
+    lucro_atual = float(df_calc['Lucro'].sum())
+    colunas = ['Receita', 'Lucro', 'MargemMedia', 'Criticos', 'Atencao', 'Saudaveis', 'NovosCriticos']
+    metricas = np.zeros((len(grade), len(colunas)))
+    distribuicao = np.zeros((len(grade), len(BORDAS_MARGEM) + 1), dtype=np.int64)
+    bloco = max(1, celulas_por_bloco // max(n, 1))
+    for (nome, delta_desconto), idx in grade.groupby(['Frete', 'DeltaDesconto'], sort=False).indices.items():
+        base = _base(df_calc, tabelas_frete[nome], delta_desconto)
+        receita = base[0].sum()
+        for parte in (idx[i:i + bloco] for i in range(0, len(idx), bloco)):
+            p = grade.iloc[parte]
+            lucro, margem = _avaliar(base, p['Imposto'].to_numpy(float)[:, None], p['DeltaTaxa'].to_numpy(float)[:, None])
+            critico = margem < MARGEM_CRITICA
+            atencao = ~critico & (margem < MARGEM_ATENCAO)
+            metricas[parte] = np.column_stack([
+                np.full(len(parte), receita), lucro.sum(axis=1), margem.mean(axis=1) if n else np.zeros(len(parte)),
+                critico.sum(axis=1), atencao.sum(axis=1), n - critico.sum(axis=1) - atencao.sum(axis=1),
+                (critico & ~critico_atual).sum(axis=1)])
+            distribuicao[parte] = distribuicao_margem(margem)
+    resumo = pd.concat([grade.reset_index(drop=True), pd.DataFrame(metricas, columns=colunas)], axis=1)
+    resumo[colunas[3:]] = resumo[colunas[3:]].astype(np.int64)
+    resumo.insert(resumo.columns.get_loc('Lucro') + 1, 'DeltaLucro', resumo['Lucro'] - lucro_atual)
+    return resumo, distribuicao
+
+def novos_criticos(df_calc, tabela_frete, imposto, delta_taxa, delta_desconto):
+    # Produtos que passam a "Crítico" num cenário, do pior para o melhor
+    lucro, margem = _avaliar(_base(df_calc, tabela_frete, delta_desconto), imposto, delta_taxa)
+    atual = df_calc['MargemVenda'].to_numpy(float)
+    cai = (margem < MARGEM_CRITICA) & (atual >= MARGEM_CRITICA)
+    res = pd.DataFrame({
+        'id': df_calc['id'].to_numpy()[cai], 'MLB': df_calc['MLB'].to_numpy()[cai], 'SKU': df_calc['SKU'].to_numpy()[cai],
+        'Produto': df_calc['Produto'].to_numpy()[cai], 'MargemAtual': atual[cai], 'MargemCenario': margem[cai],
+        'LucroAtual': df_calc['Lucro'].to_numpy(float)[cai], 'LucroCenario': lucro[cai]})
+    return res.sort_values('MargemCenario', kind='stable').reset_index(drop=True)
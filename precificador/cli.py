@@ -0,0 +1,114 @@
+# Linha de comando para jobs em lote, sem Streamlit:
+#   python -m precificador anuncios.xlsx precificado.parquet --aba Base --cabecalho 8 --imposto 27 --processos 8
+import argparse
+import itertools
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .exportacao import EscritorTabela
+from .importacao import CAMPOS_IMPORTADOS, ler_planilha_em_blocos, listar_abas, normalizar_bloco, somar_ocorrencias, sugerir_coluna
+from .precos import COLUNAS_NUMERICAS, FRETE_PADRAO, IMPOSTO_PADRAO, calcular_precos, calcular_precos_sugeridos
+from .regras import carregar_regras, compilar_regras, montar_tabela_frete
+
+FORMATOS = ('.csv', '.xlsx', '.parquet')
+
+def _precificar_bloco(tarefa):
+    # Executa em um processo do pool: limpeza + precificação de um bloco já lido
+    bloco, primeiro_id, mapa, imposto, tabela_frete, sugerir = tarefa
+    df, ocorrencias, _ = normalizar_bloco(bloco, mapa)
+    df.insert(0, 'id', np.arange(primeiro_id, primeiro_id + len(df)))
+    res = calcular_precos(df, imposto, tabela_frete)
+    if sugerir:
+        sugestao = calcular_precos_sugeridos(res, imposto, tabela_frete)
+        res['PrecoSugerido'] = sugestao['PrecoNovo'].to_numpy()
+        res['FaixaSugerida'] = sugestao['FaixaFrete'].to_numpy()
+    return res, ocorrencias
+
+def _argumentos(argv):
+    p = argparse.ArgumentParser(prog="python -m precificador", description="Precifica um catálogo grande (CSV/XLSX/Parquet) em lote.")
+    p.add_argument("entrada", help="arquivo de entrada (.csv, .xlsx ou .parquet)")
+    p.add_argument("saida", help="arquivo de saída (.csv, .xlsx ou .parquet)")
+    p.add_argument("--aba", help="aba da planilha (padrão: a primeira)")
+    p.add_argument("--cabecalho", type=int, default=0, help="linha do cabeçalho, começando em 0 (padrão: 0)")
+    p.add_argument("--coluna", action="append", default=[], metavar="CAMPO=COLUNA",
+                   help=f"mapeia um campo ({', '.join(CAMPOS_IMPORTADOS + [c for c in COLUNAS_NUMERICAS if c not in CAMPOS_IMPORTADOS])}) para uma coluna")
+    p.add_argument("--imposto", type=float, default=IMPOSTO_PADRAO, help="impostos %% (padrão: %(default)s)")
+    for chave, valor in FRETE_PADRAO.items():
+        p.add_argument("--" + chave.replace("taxa_", "frete-").replace("_", "-"), dest=chave, type=float, default=valor,
+                       help="tarifa da faixa (padrão: %(default)s)")
+    p.add_argument("--regras", metavar="ARQUIVO.json", help="tabela de regras de frete/comissão (substitui as opções --frete-*)")
+    p.add_argument("--sugerir", action="store_true", help="inclui o preço sugerido pelo lucro alvo do ERP")
+    p.add_argument("--bloco", type=int, default=50000, help="linhas por bloco (padrão: %(default)s)")
+    p.add_argument("--processos", type=int, default=os.cpu_count() or 1, help="processos de trabalho (padrão: núcleos da máquina)")
+    return p.parse_args(argv)
+
+def main(argv=None):
+    args = _argumentos(argv)
+    if not args.entrada.lower().endswith(FORMATOS) or not args.saida.lower().endswith(FORMATOS):
+        print(f"Formatos suportados: {', '.join(FORMATOS)}", file=sys.stderr)
+        return 2
+    if args.regras:
+        try: tabela_frete = compilar_regras(carregar_regras(args.regras))
+        except (OSError, ValueError) as e:
+            print(f"Regras inválidas em {args.regras}: {e}", file=sys.stderr)
+            return 2
+    else:
+        tabela_frete = montar_tabela_frete(**{k: getattr(args, k) for k in FRETE_PADRAO})
+    inicio = time.time()
+    with open(args.entrada, 'rb') as arquivo:
+        aba = args.aba or listar_abas(arquivo, args.entrada)[0]
+        blocos = ler_planilha_em_blocos(arquivo, args.entrada, aba, args.cabecalho, tamanho_bloco=args.bloco)
+        primeiro, fracao = next(blocos, (None, None))
+        if primeiro is None:
+            print("Arquivo vazio.", file=sys.stderr)
+            return 1
+        colunas = list(primeiro.columns)
+        mapa = {c: sugerir_coluna(colunas, c) for c in dict.fromkeys(CAMPOS_IMPORTADOS + COLUNAS_NUMERICAS)}
+        for par in args.coluna:
+            campo, _, coluna = par.partition("=")
+            if coluna not in colunas:
+                print(f"Coluna '{coluna}' não existe. Disponíveis: {', '.join(colunas)}", file=sys.stderr)
+                return 2
+            mapa[campo.strip()] = coluna
+        if not mapa.get('Produto'):
+            print("Nenhuma coluna de Produto encontrada; use --coluna Produto=<coluna>.", file=sys.stderr)
+            return 2
+        print("Mapeamento: " + ", ".join(f"{k}={v}" for k, v in mapa.items() if v), file=sys.stderr)
+
+        def tarefas():
+            lidas = 0
+            for bloco, _ in itertools.chain([(primeiro, fracao)], blocos):
+                yield (bloco, lidas + 1, mapa, args.imposto, tabela_frete, args.sugerir)
+                lidas += len(bloco)
+
+        saida, ocorrencias = EscritorTabela(args.saida), {}
+        def gravar(resultado):
+            res, ocorr = resultado
+            saida.escrever(res)
+            somar_ocorrencias(ocorrencias, ocorr)
+            print(f"\r{saida.linhas} linhas precificadas", end="", file=sys.stderr)
+
+        try:
+            if args.processos <= 1:
+                for resultado in map(_precificar_bloco, tarefas()): gravar(resultado)
+            else:
+                # Leitura no processo principal; limpeza e cálculo nos workers, no máximo 2 blocos por worker em voo.
+                # Os blocos são gravados na ordem da entrada.
+                with ProcessPoolExecutor(max_workers=args.processos) as pool:
+                    pendentes = deque()
+                    for tarefa in tarefas():
+                        pendentes.append(pool.submit(_precificar_bloco, tarefa))
+                        while len(pendentes) >= 2 * args.processos or (pendentes and pendentes[0].done()):
+                            gravar(pendentes.popleft().result())
+                    while pendentes: gravar(pendentes.popleft().result())
+        finally:
+            saida.fechar()
+    print(f"\n{saida.linhas} linhas gravadas em {args.saida} ({time.time() - inicio:.1f}s)", file=sys.stderr)
+    for motivo, qtd in ocorrencias.items():
+        if qtd: print(f"  {motivo}: {qtd}", file=sys.stderr)
+    return 0
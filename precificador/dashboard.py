@@ -0,0 +1,35 @@
+# Agregados do painel de dashboards a partir do catálogo precificado (sem Plotly/Streamlit)
+import numpy as np
+import pandas as pd
+
+# Ordem das camadas de status na densidade (a mesma das cores do painel)
+ORDEM_STATUS = ("Crítico", "Atenção", "Saudável")
+
+def agregar_dashboard(df_calc, sobre_venda=True, limite_pontos=5000):
+    df_dash = pd.DataFrame({
+        'Produto': df_calc['Produto'], 'Margem': df_calc['MargemVenda' if sobre_venda else 'MargemSobreERP'],
+        'Lucro': df_calc['Lucro'], 'Status': df_calc['Status' if sobre_venda else 'StatusERP'], 'Venda': df_calc['PrecoFinal'],
+        'Custo': df_calc['CMV'], 'Imposto': df_calc['ValorImposto'], 'Comissão': df_calc['ValorComissao'], 'Frete': df_calc['ValorFrete']})
+    counts = df_dash['Status'].value_counts().reset_index()
+    counts.columns = ['Status', 'Qtd']
+    agregados = {
+        'n': len(df_dash), 'margem_media': float(df_dash['Margem'].mean()), 'lucro_total': float(df_dash['Lucro'].sum()),
+        'status': counts, 'top': df_dash.nlargest(10, 'Venda').astype({'Produto': str}),
+    }
+    if len(df_dash) <= limite_pontos:
+        agregados['dispersao'] = df_dash[['Produto', 'Venda', 'Margem', 'Status']].astype({'Produto': str})
+    else:
+        # Catálogo grande: densidade preço x margem calculada aqui (contagem por status em cada célula)
+        # e só uma amostra de `limite_pontos` produtos vai para o navegador
+        x, y = df_dash['Venda'].to_numpy(float), df_dash['Margem'].to_numpy(float)
+        x_max = max(float(np.quantile(x, 0.995)), 1.0)
+        y_min, y_max = (float(v) for v in np.quantile(y, [0.005, 0.995]))
+        bordas_x = np.linspace(min(float(x.min()), 0.0), x_max, 61)
+        bordas_y = np.linspace(y_min, max(y_max, y_min + 1.0), 41)
+        xc, yc = np.clip(x, bordas_x[0], bordas_x[-1]), np.clip(y, bordas_y[0], bordas_y[-1])
+        status = df_dash['Status'].to_numpy()
+        por_status = np.stack([np.histogram2d(xc[status == s], yc[status == s], bins=[bordas_x, bordas_y])[0] for s in ORDEM_STATUS], axis=-1)
+        amostra = np.sort(np.random.default_rng(0).choice(len(df_dash), limite_pontos, replace=False))
+        agregados['densidade'] = {'bordas_x': bordas_x, 'bordas_y': bordas_y, 'por_status': por_status}
+        agregados['amostra'] = df_dash.iloc[amostra][['Venda', 'Margem', 'Status']]
+    return agregados
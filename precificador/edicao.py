@@ -0,0 +1,64 @@
+# Edição em massa do catálogo: diferenças entre a grade editada e o catálogo, validação e aplicação das
+# edições pendentes em uma tabela, para repreçar o lote inteiro de uma vez antes de gravar
+import numpy as np
+import pandas as pd
+
+from .precos import COLUNAS_NUMERICAS, COLUNAS_TEXTO
+
+COLUNAS_EDITAVEIS = COLUNAS_TEXTO + COLUNAS_NUMERICAS
+
+# (mínimo, máximo) aceitos em cada campo numérico; None = sem limite
+LIMITES_EDICAO = {
+    'CMV': (0.0, None), 'FreteManual': (0.0, None), 'TaxaML': (0.0, 100.0), 'Extra': (0.0, None), 'PrecoERP': (0.0, None),
+    'MargemERP': (None, 100.0), 'PrecoBase': (0.0, None), 'DescontoPct': (0.0, 100.0), 'Bonus': (None, None),
+}
+
+def _texto(valores):
+    # None/NaN (célula apagada na grade) -> ""
+    return np.array(["" if pd.isna(v) else str(v).strip() for v in valores], dtype=object)
+
+def diferencas(original, editado, colunas=COLUNAS_EDITAVEIS):
+    # {id: {campo: valor}} só com as células que mudaram; as duas tabelas alinhadas linha a linha, com 'id'
+    mudou = {}
+    ids = original['id'].to_numpy()
+    for c in colunas:
+        if c not in editado: continue
+        if c in COLUNAS_TEXTO:
+            antes, depois = _texto(original[c]), _texto(editado[c])
+            diff = antes != depois
+        else:
+            antes, depois = original[c].to_numpy(float), pd.to_numeric(editado[c], errors='coerce').to_numpy(float)
+            diff = ~np.isclose(antes, depois, rtol=0, atol=1e-9, equal_nan=True)
+        for i, v in zip(ids[diff].tolist(), depois[diff].tolist()): mudou.setdefault(int(i), {})[c] = v
+    return mudou
+
+def aplicar_edicoes(df, edicoes):
+    # Linhas de `df` (tabela de produtos) que têm edição pendente, já com os valores novos
+    base = df.set_index('id')
+    ids = [i for i in edicoes if i in base.index]
+    novo = base.loc[ids].astype({c: object for c in COLUNAS_TEXTO if c in base})
+    for c in COLUNAS_EDITAVEIS:
+        valores = {i: edicoes[i][c] for i in ids if c in edicoes[i]}
+        if not valores: continue
+        pos = novo.index.get_indexer(list(valores))
+        novos = _texto(list(valores.values())) if c in COLUNAS_TEXTO else pd.to_numeric(pd.Series(list(valores.values())), errors='coerce').to_numpy(float)
+        coluna = novo[c].to_numpy(copy=True)
+        coluna[pos] = novos
+        novo[c] = coluna
+    return novo.reset_index()
+
+def validar_edicoes(df, edicoes):
+    # Problemas nas células editadas (saída de aplicar_edicoes): (id, Produto, Campo, Problema); vazio = lote pode ser gravado
+    ids = df['id'].tolist()
+    def editado(c): return np.array([c in edicoes.get(i, ()) for i in ids], bool)
+    problemas = [pd.DataFrame({'id': df['id'].to_numpy()[editado('Produto') & (df['Produto'] == "").to_numpy()], 'Campo': 'Produto', 'Problema': "nome vazio"})]
+    for c, (minimo, maximo) in LIMITES_EDICAO.items():
+        v = np.where(editado(c), df[c].to_numpy(float), 0.0 if minimo is None else minimo)
+        testes = [(np.isnan(v), "valor inválido ou vazio")]
+        if minimo is not None: testes.append((v < minimo, f"menor que {minimo:g}"))
+        if maximo is not None: testes.append((v > maximo, f"maior que {maximo:g}"))
+        for ruim, motivo in testes:
+            if ruim.any(): problemas.append(pd.DataFrame({'id': df['id'].to_numpy()[ruim], 'Campo': c, 'Problema': motivo}))
+    res = pd.concat(problemas, ignore_index=True)
+    res.insert(1, 'Produto', res['id'].map(dict(zip(df['id'], df['Produto']))))
+    return res
@@ -0,0 +1,76 @@
+# Exportação do resultado da precificação em blocos: CSV, XLSX (write-only) e Parquet
+import io
+import os
+
+MIME_EXPORTACAO = {
+    '.csv': 'text/csv',
+    '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    '.parquet': 'application/vnd.apache.parquet',
+}
+
+# Memória de cálculo por linha: coluna do cálculo -> nome no relatório
+COLUNAS_RELATORIO = {
+    'MLB': 'MLB', 'SKU': 'SKU', 'Produto': 'Produto', 'TipoAnuncio': 'Tipo Anúncio', 'Categoria': 'Categoria',
+    'PrecoBase': 'Preço Base', 'DescontoPct': 'Desconto %', 'PrecoFinal': 'Preço Venda',
+    'CMV': 'CMV', 'ValorImposto': 'Imposto R$', 'TaxaAplicada': 'Comissão %', 'ValorComissao': 'Comissão R$',
+    'FaixaFrete': 'Faixa Frete', 'MotivoFrete': 'Regra Frete', 'ValorFrete': 'Frete R$',
+    'Extra': 'Extras', 'Bonus': 'Bônus', 'Lucro': 'Lucro', 'MargemVenda': 'Margem Venda %', 'Status': 'Status',
+    'PrecoERP': 'Preço ERP', 'MargemERP': 'Margem Alvo ERP %', 'MargemSobreERP': 'Margem ERP %', 'StatusERP': 'Status ERP',
+}
+
+class EscritorTabela:
+    # Escreve os blocos conforme chegam, sem juntar o resultado inteiro na memória.
+    # `destino` é um caminho ou um buffer binário (BytesIO); o formato vem da extensão.
+    def __init__(self, destino, formato=None):
+        self.destino = destino
+        self.formato = (formato or os.path.splitext(destino)[1]).lower()
+        if self.formato not in MIME_EXPORTACAO: raise ValueError(f"Formato não suportado: {self.formato}")
+        self._arquivo = self._escritor = self._planilha = None
+        self.linhas = 0
+
+    def escrever(self, df):
+        if self.formato == '.csv':
+            if self._arquivo is None:
+                if isinstance(self.destino, str): self._arquivo = open(self.destino, 'w', newline='', encoding='utf-8')
+                else: self._arquivo = io.TextIOWrapper(self.destino, encoding='utf-8', newline='')
+            df.to_csv(self._arquivo, header=self.linhas == 0, index=False)
+        elif self.formato == '.parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            tabela = pa.Table.from_pandas(df, preserve_index=False)
+            if self._escritor is None: self._escritor = pq.ParquetWriter(self.destino, tabela.schema)
+            self._escritor.write_table(tabela.cast(self._escritor.schema))
+        else:
+            import openpyxl
+            if self._planilha is None:
+                self._planilha = openpyxl.Workbook(write_only=True)
+                self._aba = self._planilha.create_sheet("Precificação")
+                self._aba.append(list(df.columns))
+            if self.linhas + len(df) >= 1048576: raise ValueError("XLSX limitado a 1.048.575 linhas; use .csv ou .parquet")
+            for linha in df.itertuples(index=False, name=None): self._aba.append(linha)
+        self.linhas += len(df)
+
+    def fechar(self):
+        if self._arquivo is not None:
+            # Em buffer, solta o wrapper de texto sem fechar o BytesIO de quem chamou
+            if isinstance(self.destino, str): self._arquivo.close()
+            else: self._arquivo.detach()
+        if self._escritor is not None: self._escritor.close()
+        if self._planilha is not None: self._planilha.save(self.destino)
+
+def relatorio_precificacao(df_calc):
+    # Seleciona e renomeia as colunas do cálculo para o relatório
+    colunas = [c for c in COLUNAS_RELATORIO if c in df_calc.columns]
+    return df_calc[colunas].rename(columns=COLUNAS_RELATORIO)
+
+def exportar_relatorio(df_calc, formato, destino=None, tamanho_bloco=50000):
+    # Grava o relatório em blocos; sem destino, devolve os bytes do arquivo
+    buffer = io.BytesIO() if destino is None else destino
+    saida = EscritorTabela(buffer, formato)
+    try:
+        relatorio = relatorio_precificacao(df_calc)
+        if relatorio.empty: saida.escrever(relatorio)
+        for inicio in range(0, len(relatorio), tamanho_bloco): saida.escrever(relatorio.iloc[inicio:inicio + tamanho_bloco])
+    finally:
+        saida.fechar()
+    return buffer.getvalue() if destino is None else saida.linhas
@@ -0,0 +1,216 @@
+# Leitura em blocos de planilhas (xlsx/csv/parquet), limpeza vetorizada e mesclagem com o catálogo
+import codecs
+import csv
+import os
+
+import numpy as np
+import pandas as pd
+
+from .precos import COLUNAS_NUMERICAS, COLUNAS_PRODUTO, COLUNAS_TEXTO, tabela_produtos
+
+# Campos que a planilha pode trazer e palavras usadas para sugerir a coluna de cada um
+CAMPOS_IMPORTADOS = ["Produto", "MLB", "SKU", "CMV", "PrecoBase", "PrecoERP", "DescontoPct", "Bonus", "TipoAnuncio", "Categoria"]
+PALAVRAS_CAMPOS = {
+    "Produto": ["Produto", "Nome"], "MLB": ["Anúncio", "MLB"], "SKU": ["SKU", "Ref"], "CMV": ["CMV"],
+    "PrecoBase": ["Preço", "Venda"], "PrecoERP": ["ERP", "Base", "GRA"], "DescontoPct": ["Desconto", "%"],
+    "Bonus": ["Bônus", "Rebate", "Bonus"], "TipoAnuncio": ["Tipo de anúncio", "Tipo"], "Categoria": ["Categoria"],
+}
+# Valores de cadastro para campos que a planilha não traz
+VALORES_PADRAO = {"FreteManual": 18.86, "TaxaML": 16.5, "Extra": 0.0, "MargemERP": 20.0}
+
+def limpar_coluna_dinheiro(serie):
+    # Versão vetorizada das regras de moeda BRL: '.' de milhar, ',' decimal, '-'/vazio/inválido = 0
+    if pd.api.types.is_numeric_dtype(serie):
+        return pd.to_numeric(serie, errors='coerce').fillna(0.0).astype(float)
+    eh_texto = serie.apply(isinstance, args=(str,))
+    res = pd.to_numeric(serie.where(~eh_texto), errors='coerce')
+    if eh_texto.any():
+        txt = serie[eh_texto].str.replace(r'[^\d,\.-]', '', regex=True)
+        ambos = txt.str.contains(',', regex=False) & txt.str.contains('.', regex=False)
+        txt = txt.where(~ambos, txt.str.replace('.', '', regex=False)).str.replace(',', '.', regex=False)
+        res[eh_texto] = pd.to_numeric(txt, errors='coerce')
+    return res.fillna(0.0).astype(float)
+
+def limpar_coluna_texto(serie):
+    return serie.where(serie.notna(), "").astype(str).str.strip().replace("nan", "")
+
+def _nomes_colunas(cabecalho):
+    # Mesmo padrão do pandas para cabeçalhos vazios ("Unnamed: i") e sempre como texto
+    return [f"Unnamed: {i}" if c is None or str(c).strip() == "" else str(c).strip() for i, c in enumerate(cabecalho)]
+
+def _dialeto_csv(arquivo, tamanho_amostra=65536):
+    amostra = arquivo.read(tamanho_amostra)
+    arquivo.seek(0)
+    # Decodificador incremental: um caractere multibyte cortado no fim da amostra não é erro (o resto está no arquivo)
+    try:
+        texto = codecs.getincrementaldecoder('utf-8')().decode(amostra, final=len(amostra) < tamanho_amostra)
+        encoding = 'utf-8-sig' if amostra.startswith(codecs.BOM_UTF8) else 'utf-8'
+    except UnicodeDecodeError:
+        texto, encoding = amostra.decode('latin-1'), 'latin-1'
+    try: sep = csv.Sniffer().sniff(texto, delimiters=";,\t|").delimiter
+    except csv.Error: sep = ","
+    return sep, encoding
+
+def sugerir_coluna(colunas, campo):
+    # Nome idêntico ao campo primeiro; depois a primeira coluna que contém uma das palavras-chave
+    if campo in colunas: return campo
+    for c in colunas:
+        for k in PALAVRAS_CAMPOS.get(campo, ()):
+            if k.lower() in str(c).lower(): return c
+    return None
+
+def _tamanho(arquivo):
+    if hasattr(arquivo, 'getbuffer'): return len(arquivo.getbuffer())
+    try: return os.fstat(arquivo.fileno()).st_size
+    except (AttributeError, OSError): return None
+
+def listar_abas(arquivo, nome):
+    if nome.lower().endswith('.csv'): return ["CSV"]
+    if nome.lower().endswith('.parquet'): return ["Parquet"]
+    import openpyxl
+    wb = openpyxl.load_workbook(arquivo, read_only=True, data_only=True)
+    try: return wb.sheetnames
+    finally: wb.close()
+
+def ler_planilha_em_blocos(arquivo, nome, aba, header_row, tamanho_bloco=20000):
+    # Gera (DataFrame do bloco, fração lida) sem carregar a planilha inteira na memória
+    arquivo.seek(0)
+    if nome.lower().endswith('.parquet'):
+        import pyarrow.parquet as pq
+        pf = pq.ParquetFile(arquivo)
+        total, lidas = max(pf.metadata.num_rows, 1), 0
+        for lote in pf.iter_batches(batch_size=tamanho_bloco):
+            bloco = lote.to_pandas()
+            bloco.columns = _nomes_colunas(bloco.columns)
+            lidas += len(bloco)
+            yield bloco, min(lidas / total, 1.0)
+        return
+    if nome.lower().endswith('.csv'):
+        sep, encoding = _dialeto_csv(arquivo)
+        total = _tamanho(arquivo)
+        leitor = pd.read_csv(arquivo, sep=sep, encoding=encoding, header=header_row, dtype=str, chunksize=tamanho_bloco)
+        for bloco in leitor:
+            bloco.columns = _nomes_colunas(bloco.columns)
+            yield bloco, (min(arquivo.tell() / total, 1.0) if total else None)
+        return
+    import openpyxl
+    wb = openpyxl.load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        ws = wb[aba]
+        total = ws.max_row
+        linhas = ws.iter_rows(values_only=True)
+        for _ in range(header_row): next(linhas, None)
+        cabecalho = _nomes_colunas(next(linhas, ()) or ())
+        n_cols, lidas, bloco = len(cabecalho), header_row + 1, []
+        for linha in linhas:
+            bloco.append((tuple(linha) + (None,) * n_cols)[:n_cols])
+            if len(bloco) >= tamanho_bloco:
+                lidas += len(bloco)
+                yield pd.DataFrame(bloco, columns=cabecalho, dtype=object), (min(lidas / total, 1.0) if total else None)
+                bloco = []
+        if bloco or lidas == header_row + 1:
+            lidas += len(bloco)
+            yield pd.DataFrame(bloco, columns=cabecalho, dtype=object), 1.0
+    finally:
+        wb.close()
+
+def normalizar_bloco(bloco, mapa):
+    # mapa: campo do produto -> coluna da planilha. Campos sem coluna recebem VALORES_PADRAO (ou 0/"").
+    # Devolve (produtos do bloco, contagem de ocorrências, posições rejeitadas no bloco)
+    produto = limpar_coluna_texto(bloco[mapa['Produto']])
+    validos = (produto != "").to_numpy()
+    ocorrencias = {'Produto vazio': int((~validos).sum())}
+    b = bloco[validos]
+    df = pd.DataFrame({'Produto': produto[validos]})
+    for campo in COLUNAS_TEXTO:
+        if campo != 'Produto': df[campo] = limpar_coluna_texto(b[mapa[campo]]) if mapa.get(campo) else ""
+    for campo in COLUNAS_NUMERICAS:
+        if not mapa.get(campo):
+            df[campo] = VALORES_PADRAO.get(campo, 0.0)
+            continue
+        bruto = b[mapa[campo]]
+        valores = limpar_coluna_dinheiro(bruto)
+        if not pd.api.types.is_numeric_dtype(bruto):
+            # Células preenchidas que viraram 0 por não serem números (ex.: "consultar")
+            preenchido = limpar_coluna_texto(bruto).str.replace(r'[\s\-R$0,\.%]', '', regex=True) != ""
+            n_inv = int((preenchido & (valores == 0)).sum())
+            if n_inv: ocorrencias[f"{campo} inválido (→ 0)"] = n_inv
+        df[campo] = valores
+    df['PrecoERP'] = df['PrecoERP'].where(df['PrecoERP'] != 0, df['PrecoBase'])
+    df['DescontoPct'] = df['DescontoPct'].where(~((df['DescontoPct'] > 0) & (df['DescontoPct'] < 1.0)), df['DescontoPct'] * 100)
+    return df[COLUNAS_PRODUTO[1:]].reset_index(drop=True), ocorrencias, np.flatnonzero(~validos)
+
+def somar_ocorrencias(total, ocorrencias):
+    for motivo, qtd in ocorrencias.items(): total[motivo] = total.get(motivo, 0) + qtd
+    return total
+
+def importar_planilha(blocos, mapa, progresso=None):
+    partes, rejeitados, ocorrencias, linha_base = [], [], {}, 0
+    for bloco, fracao in blocos:
+        parte, ocorr, rej = normalizar_bloco(bloco, mapa)
+        if len(rejeitados) < 50: rejeitados.extend((linha_base + rej)[:50 - len(rejeitados)].tolist())
+        somar_ocorrencias(ocorrencias, ocorr)
+        partes.append(parte)
+        linha_base += len(bloco)
+        if progresso: progresso(fracao, linha_base)
+    df = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=COLUNAS_PRODUTO[1:])
+    relatorio = {'lidas': linha_base, 'importadas': len(df), 'ocorrencias': ocorrencias, 'linhas_rejeitadas': rejeitados}
+    return df, relatorio
+
+def comparar_importacao(catalogo, df_novos, campos):
+    # Casa as linhas importadas com o catálogo por MLB (ou SKU, sem MLB dos dois lados) e separa inserções, alterações e ausentes.
+    # MLB preenchido e desconhecido é anúncio novo: anúncios Clássico/Premium do mesmo item dividem o SKU.
+    # Só os `campos` escolhidos são sincronizados nos produtos existentes; linhas ignoradas ou ambíguas vão para `conflitos`.
+    mlb, sku = df_novos['MLB'], df_novos['SKU']
+    por_mlb = mlb.where(mlb != "").map(catalogo.mapa_mlb())
+    por_sku = sku.where((mlb == "") & (sku != "")).map(catalogo.mapa_sku(sem_mlb=True))
+    candidatos = por_mlb.where(por_mlb.notna(), por_sku)
+    ids = candidatos.map(lambda c: c[0], na_action='ignore')
+    conflitos = [df_novos[(candidatos.map(len, na_action='ignore') > 1).to_numpy()].assign(Motivo="Chave em mais de um produto do catálogo; casada com o mais antigo")]
+    # Um produto casado por várias linhas fica com a de MLB, depois com a última da planilha
+    casados = df_novos[ids.notna()].assign(id=ids[ids.notna()].astype('int64'), pelo_mlb=por_mlb[ids.notna()].notna())
+    casados = casados.sort_values('pelo_mlb', kind='stable')
+    repetidos = casados.duplicated('id', keep='last')
+    conflitos.append(casados[repetidos].assign(Motivo="Produto do catálogo já casado com outra linha; linha ignorada"))
+    casados = casados[~repetidos].sort_index().drop(columns='pelo_mlb')
+    novos = df_novos[ids.isna()]
+    chave = novos['MLB'].where(novos['MLB'] != "", novos['SKU'])
+    repetidos = ((chave != "") & chave.duplicated(keep='last')).to_numpy()
+    conflitos.append(novos[repetidos].assign(Motivo="MLB/SKU repetido entre as linhas novas; ficou a última"))
+    novos = novos[~repetidos]
+    conflitos = pd.concat(conflitos)[['Produto', 'MLB', 'SKU', 'Motivo']].sort_index(kind='stable')
+
+    atual = tabela_produtos(catalogo.tabela(casados['id'].tolist())).set_index('id')
+    casados = casados.set_index('id')
+    mudou = pd.DataFrame(False, index=casados.index, columns=campos)
+    for c in campos:
+        if c in COLUNAS_NUMERICAS: mudou[c] = ~np.isclose(casados[c].to_numpy(float), atual[c].to_numpy(float), rtol=0, atol=1e-9)
+        else: mudou[c] = casados[c].to_numpy() != atual[c].to_numpy()
+    alterados = mudou.index[mudou.any(axis=1).to_numpy()]
+
+    atualizacoes, preview = [], []
+    for id_produto in alterados:
+        campos_mudados = [c for c in campos if mudou.at[id_produto, c]]
+        atualizacoes.append((int(id_produto), {c: float(casados.at[id_produto, c]) if c in COLUNAS_NUMERICAS else str(casados.at[id_produto, c])
+                                               for c in campos_mudados}))
+        if len(preview) < 500:
+            preview.extend({'Produto': atual.at[id_produto, 'Produto'], 'Campo': c, 'Antes': str(atual.at[id_produto, c]),
+                            'Depois': str(casados.at[id_produto, c])} for c in campos_mudados)
+    vistos = set(casados.index)
+    ausentes = [i for i in catalogo.ids().tolist() if i not in vistos]
+    return {'atualizar': atualizacoes, 'inserir': novos, 'ausentes': ausentes,
+            'inalterados': len(casados) - len(alterados), 'preview': pd.DataFrame(preview), 'conflitos': conflitos.reset_index(drop=True)}
+
+def aplicar_mesclagem(catalogo, diff, remover_ausentes=False):
+    # Aplica o diff no catálogo (de uma vez, sob a trava) e devolve (ids gravados, ids removidos) para salvar só essas linhas
+    gravados = []
+    with catalogo.trava:
+        for id_produto, campos in diff['atualizar']:
+            catalogo.atualizar(id_produto, campos)
+            gravados.append(id_produto)
+        novos = diff['inserir'].copy()
+        novos['id'] = catalogo.reservar_ids(len(novos)) + np.arange(len(novos))
+        gravados.extend(catalogo.adicionar_lote(novos[COLUNAS_PRODUTO].to_dict('records')))
+        removidos = list(diff['ausentes']) if remover_ausentes else []
+        for id_produto in removidos: catalogo.remover(id_produto)
+    return gravados, removidos
@@ -0,0 +1,72 @@
+# Tempo e memória por fase (rerun do app ou etapa do benchmark). Desligado, `fase` não mede nada.
+# As fases são sequenciais, não aninhadas (o pico do tracemalloc é zerado no início de cada uma).
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows: sem pico de memória do processo
+    resource = None
+
+def pico_processo_mb():
+    # Pico de memória residente do processo (ru_maxrss: KB no Linux, bytes no macOS)
+    if resource is None: return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+# O tracemalloc ligado por um perfil é do processo, não do perfil: um rerun interrompido no meio (st.rerun) não chega a
+# finalizar, então o próximo perfil criado sem memória desliga o que ficou ligado. Tracing ligado por outra ferramenta
+# (python -X tracemalloc, depurador) nunca é desligado aqui.
+_trava_trace = threading.Lock()
+_trace_do_perfil = False
+
+class PerfilExecucao:
+    # memoria=True liga o tracemalloc (bem mais lento) para medir o pico alocado em cada fase.
+    # O tracemalloc é do processo inteiro: com várias sessões ao mesmo tempo, as alocações delas entram junto.
+    def __init__(self, ativo=True, memoria=False):
+        global _trace_do_perfil
+        self.ativo, self.memoria = ativo, ativo and memoria
+        self.fases = []
+        self.inicio = time.perf_counter()
+        with _trava_trace:
+            if self.memoria and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                _trace_do_perfil = True
+            elif not self.memoria and _trace_do_perfil:
+                tracemalloc.stop()
+                _trace_do_perfil = False
+
+    @contextmanager
+    def fase(self, nome):
+        if not self.ativo:
+            yield
+            return
+        if self.memoria and tracemalloc.is_tracing():
+            antes = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        try: yield
+        finally:
+            fase = {'Fase': nome, 'Tempo (ms)': (time.perf_counter() - t0) * 1000}
+            if self.memoria and tracemalloc.is_tracing():
+                atual, pico = tracemalloc.get_traced_memory()
+                fase['Pico alocado (MB)'] = (pico - antes) / 2**20
+                fase['Retido (MB)'] = (atual - antes) / 2**20
+            self.fases.append(fase)
+
+    def finalizar(self):
+        # Para o tracemalloc se foi um perfil que ligou; devolve o tempo total em ms
+        global _trace_do_perfil
+        with _trava_trace:
+            if self.memoria and _trace_do_perfil:
+                tracemalloc.stop()
+                _trace_do_perfil = False
+        return (time.perf_counter() - self.inicio) * 1000
+
+    def tabela(self):
+        return pd.DataFrame(self.fases)
@@ -0,0 +1,110 @@
+# Motor de precificação: funções puras sobre DataFrames/arrays, sem dependência do Streamlit
+import numpy as np
+import pandas as pd
+
+COLUNAS_TEXTO = ["MLB", "SKU", "Produto", "TipoAnuncio", "Categoria"]
+COLUNAS_NUMERICAS = ["CMV", "FreteManual", "TaxaML", "Extra", "PrecoERP", "MargemERP", "PrecoBase", "DescontoPct", "Bonus"]
+COLUNAS_PRODUTO = ["id"] + COLUNAS_TEXTO + COLUNAS_NUMERICAS
+
+# Valores iniciais da barra lateral, também usados pela linha de comando
+IMPOSTO_PADRAO = 27.0
+FRETE_PADRAO = {"taxa_minima": 3.25, "taxa_12_29": 6.25, "taxa_29_50": 6.50, "taxa_50_79": 6.75}
+# Margem % abaixo da qual o produto é "Crítico" / "Atenção"
+MARGEM_CRITICA, MARGEM_ATENCAO = 8.0, 15.0
+
+def tabela_produtos(lista):
+    # Normaliza a lista de dicts em colunas tipadas (registros antigos podem não ter SKU/PrecoERP)
+    df = pd.DataFrame(lista).reindex(columns=COLUNAS_PRODUTO)
+    df[COLUNAS_NUMERICAS] = df[COLUNAS_NUMERICAS].apply(pd.to_numeric, errors='coerce').fillna(0.0).astype(float)
+    df[COLUNAS_TEXTO] = df[COLUNAS_TEXTO].fillna("").astype(str).replace("nan", "")
+    return df
+
+def _linhas_categoria(tabela_frete, categoria, n):
+    # Linha de `fretes_categoria` de cada produto: 0 = tabela padrão, i = i-ésima categoria com frete próprio
+    if categoria is None or not len(tabela_frete["categorias"]): return np.zeros(n, dtype=int)
+    return tabela_frete["categorias"].get_indexer(np.asarray(categoria, dtype=object)) + 1
+
+def comissao_efetiva(tabela_frete, tipo, taxa_ml_pct):
+    # Comissão % do tipo de anúncio quando a tabela define uma; senão a TaxaML cadastrada no item
+    taxa = np.asarray(taxa_ml_pct, dtype=float)
+    if tipo is None or not len(tabela_frete["tipos"]): return taxa
+    idx = tabela_frete["tipos"].get_indexer(np.asarray(tipo, dtype=object))
+    return np.where(idx >= 0, tabela_frete["comissoes"][idx], taxa)
+
+def _fretes(tabela_frete, faixa, linha, frete_manual):
+    # Frete tabelado da faixa (por categoria); NaN na tabela = frete manual do item
+    valores = tabela_frete["fretes_categoria"][linha, faixa]
+    return np.where(np.isnan(valores), frete_manual, valores), np.isnan(valores)
+
+def classificar_margem(margem):
+    return np.select([margem < MARGEM_CRITICA, margem < MARGEM_ATENCAO], ["Crítico", "Atenção"], default="Saudável")
+
+def calcular_precos(df, imposto_pct, tabela_frete):
+    # Calcula todas as colunas derivadas do catálogo em uma única passada vetorizada
+    res = df.copy(deep=False)
+    pf = df['PrecoBase'].to_numpy(float) * (1 - df['DescontoPct'].to_numpy(float) / 100)
+    faixa = np.searchsorted(tabela_frete["limites"], pf, side='right')
+    linha = _linhas_categoria(tabela_frete, df['Categoria'] if 'Categoria' in df else None, len(df))
+    frete, _ = _fretes(tabela_frete, faixa, linha, df['FreteManual'].to_numpy(float))
+    imposto = pf * (imposto_pct / 100)
+    taxa = comissao_efetiva(tabela_frete, df['TipoAnuncio'] if 'TipoAnuncio' in df else None, df['TaxaML'].to_numpy(float))
+    comissao = pf * (taxa / 100)
+    lucro = pf - (df['CMV'].to_numpy(float) + df['Extra'].to_numpy(float) + frete + imposto + comissao) + df['Bonus'].to_numpy(float)
+    erp = df['PrecoERP'].to_numpy(float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        margem_venda = np.where(pf > 0, lucro / pf * 100, 0.0)
+        margem_erp = np.where(erp > 0, lucro / erp * 100, 0.0)
+    res['PrecoFinal'] = pf
+    res['FaixaFrete'] = tabela_frete["nomes"][faixa]
+    res['MotivoFrete'] = tabela_frete["motivos"][faixa]
+    res['ValorFrete'] = frete
+    res['ValorImposto'] = imposto
+    res['TaxaAplicada'] = taxa
+    res['ValorComissao'] = comissao
+    res['Lucro'] = lucro
+    res['MargemVenda'] = margem_venda
+    res['MargemSobreERP'] = margem_erp
+    res['Status'] = classificar_margem(margem_venda)
+    res['StatusERP'] = classificar_margem(margem_erp)
+    return res
+
+def resolver_preco_reverso(custo_base, lucro_alvo_reais, taxa_ml_pct, imposto_pct, frete_manual, tabela_frete, categoria=None):
+    # Preço que entrega o lucro alvo, para vetores de produtos. Cada faixa da tabela gera um candidato com o frete dela
+    # (ou o manual do item); vale o da faixa mais alta cujo preço cai dentro dela. Sem faixa consistente, frete manual.
+    # Como na versão escalar, a primeira faixa (de R$ 0 ao primeiro limite) não é candidata, salvo se for a única.
+    custo_base, lucro_alvo_reais, frete_manual = (np.asarray(v, dtype=float) for v in (custo_base, lucro_alvo_reais, frete_manual))
+    divisor = 1 - ((np.asarray(taxa_ml_pct, dtype=float) + imposto_pct) / 100)
+    limites = tabela_frete["limites"]
+    faixas = np.arange(len(limites), -1, -1)[:max(len(limites), 1)]
+    inferior = np.concatenate([[0.0], limites])[faixas][:, None]
+    superior = np.concatenate([limites, [np.inf]])[faixas][:, None]
+    linha = _linhas_categoria(tabela_frete, categoria, len(custo_base))
+    fretes, manual = _fretes(tabela_frete, faixas[:, None], linha[None, :], frete_manual[None, :])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        preco_manual = (custo_base + frete_manual + lucro_alvo_reais) / divisor
+        precos = (custo_base + fretes + lucro_alvo_reais) / divisor
+    cabe = (inferior <= precos) & (precos < superior)
+    primeira = cabe.argmax(axis=0)
+    colunas = np.arange(precos.shape[1])
+    achou = cabe.any(axis=0)
+    preco = np.where(achou, precos[primeira, colunas], preco_manual)
+    nome = np.where(achou & ~manual[primeira, colunas], tabela_frete["nomes"][faixas][primeira], "Frete Manual")
+    valido = divisor > 0
+    return np.where(valido, preco, 0.0), np.where(valido, nome, "Erro")
+
+def calcular_preco_sugerido_reverso(custo_base, lucro_alvo_reais, taxa_ml_pct, imposto_pct, frete_manual, tabela_frete, categoria=None):
+    preco, nome = resolver_preco_reverso([custo_base], [lucro_alvo_reais], [taxa_ml_pct], imposto_pct, [frete_manual], tabela_frete,
+                                         None if categoria is None else [categoria])
+    return float(preco[0]), str(nome[0])
+
+def calcular_precos_sugeridos(df, imposto_pct, tabela_frete):
+    # Repreço em lote: lucro alvo = PrecoERP x MargemERP; o preço de tabela é corrigido pelo desconto atual do item
+    taxa = comissao_efetiva(tabela_frete, df['TipoAnuncio'] if 'TipoAnuncio' in df else None, df['TaxaML'].to_numpy(float))
+    preco, nome = resolver_preco_reverso(
+        df['CMV'].to_numpy(float) + df['Extra'].to_numpy(float), df['PrecoERP'].to_numpy(float) * df['MargemERP'].to_numpy(float) / 100,
+        taxa, imposto_pct, df['FreteManual'].to_numpy(float), tabela_frete, df['Categoria'] if 'Categoria' in df else None)
+    desconto = df['DescontoPct'].to_numpy(float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        preco_base = np.where(desconto < 100, preco / (1 - desconto / 100), preco)
+    return pd.DataFrame({'id': df['id'].to_numpy(), 'Produto': df['Produto'].to_numpy(), 'PrecoAtual': df['PrecoBase'].to_numpy(float),
+                         'PrecoNovo': preco_base, 'VendaNova': preco, 'FaixaFrete': nome})
@@ -0,0 +1,145 @@
+# Tabela de regras do Mercado Livre (faixas de frete, frete por categoria, comissão por tipo de anúncio):
+# formato editável (JSON / barra lateral) compilado em arrays ordenados para searchsorted
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .precos import FRETE_PADRAO
+
+def regras_frete(taxa_minima=FRETE_PADRAO["taxa_minima"], taxa_12_29=FRETE_PADRAO["taxa_12_29"],
+                 taxa_29_50=FRETE_PADRAO["taxa_29_50"], taxa_50_79=FRETE_PADRAO["taxa_50_79"]):
+    # Faixas clássicas abaixo de R$ 79; "frete": None = usa o frete manual do item. `ate` é o limite superior (exclusivo).
+    return {
+        "faixas": [
+            {"nome": "Tab. Mínima", "ate": 12.50, "frete": taxa_minima, "motivo": "Abaixo de R$ 12.50"},
+            {"nome": "Tab. 12-29", "ate": 29.00, "frete": taxa_12_29, "motivo": "Faixa R$ 12-29"},
+            {"nome": "Tab. 29-50", "ate": 50.00, "frete": taxa_29_50, "motivo": "Faixa R$ 29-50"},
+            {"nome": "Tab. 50-79", "ate": 79.00, "frete": taxa_50_79, "motivo": "Faixa R$ 50-79"},
+            {"nome": "manual", "ate": None, "frete": None, "motivo": "Acima de 79 (Manual)"},
+        ],
+        # categoria -> {nome da faixa: frete}; só as faixas que mudam em relação à tabela padrão
+        "frete_por_categoria": {},
+        # tipo de anúncio -> comissão %; produtos de outros tipos usam a TaxaML cadastrada
+        "comissao_por_tipo": {},
+    }
+
+REGRAS_PADRAO = regras_frete()
+
+def _vazio(v):
+    return v is None or (isinstance(v, str) and not v.strip()) or (not isinstance(v, str) and pd.isna(v))
+
+def _texto(v): return "" if _vazio(v) else str(v).strip()
+
+def _valor(v):
+    # None/NaN/"" = sem valor (limite aberto ou frete manual)
+    if isinstance(v, (list, dict)): raise ValueError(f"Valor inválido: {json.dumps(v, ensure_ascii=False)}")
+    if _vazio(v): return None
+    try: return float(v.replace(',', '.')) if isinstance(v, str) else float(v)
+    except (TypeError, ValueError): raise ValueError(f"Valor inválido: {v!r}") from None
+
+def _secao(regras, chave, tipo):
+    # Seção ausente/vazia = padrão vazio; tipo errado (ex.: "faixas": 5) é erro de formato, não exceção do Python
+    valor = regras.get(chave)
+    if valor is None or valor == "": return tipo()
+    if not isinstance(valor, tipo): raise ValueError(f"'{chave}' precisa ser {'uma lista' if tipo is list else 'um objeto'}")
+    return valor
+
+def normalizar_regras(regras):
+    # Valida e devolve a tabela em forma canônica (ValueError com a mensagem para o usuário)
+    if not isinstance(regras, dict): raise ValueError("A tabela de regras precisa ser um objeto JSON com 'faixas'")
+    faixas = []
+    for i, f in enumerate(_secao(regras, "faixas", list)):
+        if not isinstance(f, dict): raise ValueError(f"Faixa {i + 1} precisa ser um objeto com nome, ate e frete")
+        nome = _texto(f.get("nome")) or f"Faixa {i + 1}"
+        faixas.append({"nome": nome, "ate": _valor(f.get("ate")), "frete": _valor(f.get("frete")), "motivo": _texto(f.get("motivo")) or nome})
+    if not faixas: raise ValueError("A tabela de regras precisa de pelo menos uma faixa")
+    # Ordem por limite, a sem limite por último: o editor da barra lateral só acrescenta linhas no fim da tabela
+    faixas.sort(key=lambda f: (f["ate"] is None, f["ate"] or 0.0))
+    if faixas[-1]["ate"] is not None: faixas.append({"nome": "manual", "ate": None, "frete": None, "motivo": f"Acima de {faixas[-1]['ate']:g} (Manual)"})
+    limites = [f["ate"] for f in faixas[:-1]]
+    if None in limites: raise ValueError("Só uma faixa pode ficar sem limite ('ate')")
+    if any(b <= a for a, b in zip(limites, limites[1:])): raise ValueError("Duas faixas com o mesmo limite ('ate')")
+    nomes = [f["nome"] for f in faixas]
+    if len(set(nomes)) != len(nomes): raise ValueError("Nomes de faixa repetidos")
+    por_categoria = {}
+    for categoria, fretes in _secao(regras, "frete_por_categoria", dict).items():
+        if not isinstance(fretes, dict): raise ValueError(f"Categoria '{categoria}' precisa ser um objeto {{faixa: frete}}")
+        for nome, frete in fretes.items():
+            if nome not in nomes: raise ValueError(f"Categoria '{categoria}': faixa '{nome}' não existe")
+            por_categoria.setdefault(_texto(categoria), {})[nome] = _valor(frete)
+    comissoes = {_texto(t): _valor(c) for t, c in _secao(regras, "comissao_por_tipo", dict).items()}
+    if any(c is None or not 0 <= c < 100 for c in comissoes.values()): raise ValueError("Comissão por tipo precisa estar entre 0 e 100%")
+    return {"faixas": faixas, "frete_por_categoria": por_categoria, "comissao_por_tipo": comissoes}
+
+def compilar_regras(regras):
+    # limites: limite superior de cada faixa exceto a última (crescentes, para searchsorted)
+    # valores: frete de cada faixa (NaN = frete manual do item); fretes_categoria: linha 0 = padrão, depois uma por categoria
+    regras = normalizar_regras(regras)
+    faixas = regras["faixas"]
+    valores = np.array([np.nan if f["frete"] is None else f["frete"] for f in faixas])
+    nomes = [f["nome"] for f in faixas]
+    categorias = sorted(regras["frete_por_categoria"])
+    fretes_categoria = np.tile(valores, (len(categorias) + 1, 1))
+    for i, categoria in enumerate(categorias, 1):
+        for nome, frete in regras["frete_por_categoria"][categoria].items():
+            fretes_categoria[i, nomes.index(nome)] = np.nan if frete is None else frete
+    tipos = list(regras["comissao_por_tipo"])
+    return {
+        "limites": np.array([f["ate"] for f in faixas[:-1]], float),
+        "valores": valores,
+        "nomes": np.array(nomes),
+        "motivos": np.array([f["motivo"] for f in faixas]),
+        "categorias": pd.Index(categorias, dtype=object),
+        "fretes_categoria": fretes_categoria,
+        "tipos": pd.Index(tipos, dtype=object),
+        "comissoes": np.array([regras["comissao_por_tipo"][t] for t in tipos], float),
+        # Identifica a tabela nos caches (arrays com NaN não comparam como iguais)
+        "assinatura": json.dumps(regras, sort_keys=True, ensure_ascii=False),
+    }
+
+def montar_tabela_frete(taxa_minima=FRETE_PADRAO["taxa_minima"], taxa_12_29=FRETE_PADRAO["taxa_12_29"],
+                        taxa_29_50=FRETE_PADRAO["taxa_29_50"], taxa_50_79=FRETE_PADRAO["taxa_50_79"]):
+    return compilar_regras(regras_frete(taxa_minima, taxa_12_29, taxa_29_50, taxa_50_79))
+
+def ajustar_fretes(regras, pct):
+    # Variante da tabela com os fretes tabelados (faixas e categorias) em +pct%; o frete manual do item não muda
+    regras = normalizar_regras(regras)
+    def ajuste(v): return None if v is None else v * (1 + pct / 100)
+    return {
+        "faixas": [dict(f, frete=ajuste(f["frete"])) for f in regras["faixas"]],
+        "frete_por_categoria": {c: {n: ajuste(v) for n, v in fretes.items()} for c, fretes in regras["frete_por_categoria"].items()},
+        "comissao_por_tipo": regras["comissao_por_tipo"],
+    }
+
+def carregar_regras(arquivo):
+    # Caminho ou arquivo aberto (upload) com a tabela em JSON
+    if isinstance(arquivo, (str, os.PathLike)):
+        with open(arquivo, encoding='utf-8') as f: return normalizar_regras(json.load(f))
+    return normalizar_regras(json.loads(arquivo.read().decode('utf-8-sig')))
+
+def salvar_regras(regras, caminho):
+    tmp = f"{caminho}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f: json.dump(normalizar_regras(regras), f, ensure_ascii=False, indent=2)
+    os.replace(tmp, caminho)
+
+def tabelas_de_regras(regras):
+    # Regras -> três tabelas planas para edição (faixas, comissão por tipo, frete por categoria)
+    faixas = pd.DataFrame(regras["faixas"], columns=["nome", "ate", "frete", "motivo"])
+    comissoes = pd.DataFrame(list(regras["comissao_por_tipo"].items()), columns=["tipo", "comissao"])
+    categorias = pd.DataFrame([(c, f, v) for c, fretes in regras["frete_por_categoria"].items() for f, v in fretes.items()],
+                              columns=["categoria", "faixa", "frete"])
+    return faixas, comissoes, categorias
+
+def regras_de_tabelas(faixas, comissoes, categorias):
+    # Caminho inverso; linhas totalmente vazias (sobras do editor) são ignoradas
+    def linhas(df): return [r for r in df.to_dict('records') if not all(_vazio(v) for v in r.values())]
+    por_categoria = {}
+    for r in linhas(categorias):
+        if _texto(r.get("categoria")): por_categoria.setdefault(_texto(r["categoria"]), {})[_texto(r.get("faixa"))] = r.get("frete")
+    return normalizar_regras({
+        "faixas": linhas(faixas),
+        "comissao_por_tipo": {_texto(r["tipo"]): r.get("comissao") for r in linhas(comissoes) if _texto(r.get("tipo"))},
+        "frete_por_categoria": por_categoria,
+    })
@@ -0,0 +1,5 @@
+# Testes do núcleo (sem Streamlit): python -m pytest -q
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,97 @@
+import random
+
+from precificador import IndiceBusca
+from precificador.catalogo import _normalizar_busca
+
+PALAVRAS = ["Caneca", "Cabo", "Capa", "Fone", "Película", "Suporte", "Mouse", "USB-C", "Térmica", "Kit", "Pro", "Mini", "Ação"]
+
+def normalizar(produtos):
+    saida = {}
+    for id_produto, (nome, mlb, sku) in produtos.items():
+        palavras = _normalizar_busca(nome)
+        codigos = [c for c in ("".join(_normalizar_busca(mlb)), "".join(_normalizar_busca(sku))) if c]
+        saida[id_produto] = (palavras, set(palavras).union(_normalizar_busca(mlb), _normalizar_busca(sku)), codigos)
+    return saida
+
+def buscar_bruto(normalizados, consulta, k):
+    # Referência: filtra todos os produtos pelos termos (prefixo de token ou trecho de código) e pontua um a um
+    termos = _normalizar_busca(consulta)
+    if not termos or k <= 0: return []
+    consulta_cod = "".join(termos)
+    resultado = []
+    for id_produto, (palavras, tokens, codigos) in normalizados.items():
+        if not all(any(t.startswith(termo) for t in tokens) or (len(termo) >= 3 and any(termo in c for c in codigos)) for termo in termos):
+            continue
+        if consulta_cod in codigos: pontos = 100
+        elif any(c.startswith(consulta_cod) for c in codigos): pontos = 50
+        elif any(consulta_cod in c for c in codigos): pontos = 25
+        else: pontos = 0
+        pontos += 10 * sum(termo in tokens for termo in termos)
+        if palavras and palavras[0].startswith(termos[0]): pontos += 5
+        resultado.append((-pontos, len(" ".join(palavras)), -id_produto))
+    return [-i for _, _, i in sorted(resultado)[:k]]
+
+def gerar(rng, ids):
+    produtos = {}
+    for i in ids:
+        nome = " ".join(rng.choice(PALAVRAS) for _ in range(rng.randint(1, 4))) + (f" {rng.randint(1, 999)}" if rng.random() < 0.5 else "")
+        mlb = f"MLB{rng.randint(10**6, 10**7)}" if rng.random() < 0.8 else ""
+        sku = rng.choice(["", f"SKU-{rng.randint(1, 5000)}", f"{rng.choice(PALAVRAS)[:3]}{rng.randint(10, 99)}"])
+        produtos[i] = (nome, mlb, sku)
+    return produtos
+
+def consultas(rng, produtos, n=30):
+    amostra = rng.sample(sorted(produtos), min(n, len(produtos)))
+    saida = ["a", "c", "mlb", "sku 1", "caneca cabo", "ter", "zz"]
+    for i in amostra:
+        nome, mlb, sku = produtos[i]
+        codigo = rng.choice([c for c in (mlb, sku) if c] or [nome])
+        inicio = rng.randrange(len(codigo))
+        saida.append(codigo[inicio:inicio + rng.randint(1, 7)])
+        saida.append(" ".join(p[:rng.randint(1, len(p))] for p in rng.sample(nome.split(), min(2, len(nome.split())))))
+        saida.append(mlb or sku or nome)
+    return saida
+
+def carregar(indice, produtos):
+    ids = list(produtos)
+    indice.adicionar_lote(ids, *([produtos[i][c] for i in ids] for c in range(3)))
+
+def conferir(indice, produtos, rng):
+    normalizados = normalizar(produtos)
+    for consulta in consultas(rng, produtos):
+        esperado = buscar_bruto(normalizados, consulta, 20)
+        assert indice.buscar(consulta, 20) == esperado, consulta
+        assert indice.buscar(consulta, 1) == esperado[:1], consulta
+
+def test_busca_igual_a_filtro_bruto_em_cada_etapa():
+    rng = random.Random(7)
+    indice = IndiceBusca()
+    indice.LIMITE_DELTA = 300
+    produtos = gerar(rng, range(1, 2001))
+    carregar(indice, produtos)
+    conferir(indice, produtos, rng)
+
+    # Acréscimos pequenos ficam no delta, até passar do limite e reconstruir
+    etapas, inicio = [], 3000
+    while len(etapas) < 2 or etapas[-1] > 0:
+        novos = gerar(rng, range(inicio, inicio + 60))
+        carregar(indice, novos)
+        produtos.update(novos)
+        etapas.append(indice._tokens.tamanho_delta)
+        conferir(indice, produtos, rng)
+        inicio += 100
+    assert etapas[0] > 0 and etapas[-1] == 0
+
+    # Atualizações (id existente) e remoções, pequenas e grandes o bastante para compactar
+    alterados = gerar(rng, rng.sample(sorted(produtos), 40))
+    carregar(indice, alterados)
+    produtos.update(alterados)
+    conferir(indice, produtos, rng)
+    for i in rng.sample(sorted(produtos), 1500):
+        indice.remover(i)
+        del produtos[i]
+    conferir(indice, produtos, rng)
+    novos = gerar(rng, range(5000, 7000))
+    carregar(indice, novos)
+    produtos.update(novos)
+    conferir(indice, produtos, rng)
@@ -0,0 +1,34 @@
+import pandas as pd
+
+from precificador import COLUNAS_PRODUTO, CatalogoProdutos, aplicar_mesclagem, comparar_importacao
+
+def produto(id_produto, nome, mlb="", sku="", cmv=10.0):
+    registro = dict.fromkeys(COLUNAS_PRODUTO, 0.0)
+    registro.update({'id': id_produto, 'Produto': nome, 'MLB': mlb, 'SKU': sku, 'TipoAnuncio': "", 'Categoria': "", 'CMV': cmv})
+    return registro
+
+def planilha(*registros):
+    return pd.DataFrame([{k: v for k, v in r.items() if k != 'id'} for r in registros], columns=COLUNAS_PRODUTO[1:])
+
+def test_sku_nao_toma_o_produto_casado_por_mlb():
+    catalogo = CatalogoProdutos([produto(1, "Caneca", "MLB1", "S1"), produto(2, "Fone", sku="S1")])
+    diff = comparar_importacao(catalogo, planilha(produto(0, "Caneca", "MLB1", "S1", 1.0), produto(0, "Fone", sku="S1", cmv=1.0)),
+                               ['Produto', 'CMV'])
+    assert sorted(i for i, _ in diff['atualizar']) == [1, 2]
+    assert diff['ausentes'] == [] and len(diff['inserir']) == 0 and len(diff['conflitos']) == 0
+    aplicar_mesclagem(catalogo, diff)
+    assert catalogo.obter(1)['Produto'] == "Caneca" and catalogo.obter(2)['Produto'] == "Fone"
+
+def test_sku_de_produto_com_mlb_nao_casa():
+    catalogo = CatalogoProdutos([produto(1, "Caneca", "MLB1", "S1")])
+    diff = comparar_importacao(catalogo, planilha(produto(0, "Fone", sku="S1")), ['Produto'])
+    assert diff['atualizar'] == [] and list(diff['inserir']['Produto']) == ["Fone"] and diff['ausentes'] == [1]
+
+def test_mlb_vence_o_sku_e_repeticoes_sao_relatadas():
+    catalogo = CatalogoProdutos([produto(1, "Caneca", "MLB1", "S1"), produto(2, "Fone", sku="S2"), produto(3, "Cabo", sku="S2")])
+    linhas = planilha(produto(0, "Caneca Nova", "MLB1"), produto(0, "Caneca Velha", "MLB1"), produto(0, "Fone", sku="S2", cmv=5.0),
+                      produto(0, "Mouse", "MLB9"), produto(0, "Mouse 2", "MLB9"))
+    diff = comparar_importacao(catalogo, linhas, ['Produto', 'CMV'])
+    assert dict(diff['atualizar'])[1] == {'Produto': "Caneca Velha"}
+    assert list(diff['inserir']['Produto']) == ["Mouse 2"]
+    assert list(diff['conflitos']['Produto']) == ["Caneca Nova", "Fone", "Mouse"]
@@ -0,0 +1,64 @@
+import math
+
+import numpy as np
+
+from precificador import FRETE_PADRAO, compilar_regras, montar_tabela_frete, normalizar_regras, regras_frete, resolver_preco_reverso
+
+def reverso_legado(custo_base, lucro_alvo_reais, taxa_ml_pct, imposto_pct, frete_manual):
+    # Função escalar original (faixas fixas do Mercado Livre), referência do resolvedor em lote
+    taxa_minima, taxa_12_29, taxa_29_50, taxa_50_79 = (FRETE_PADRAO[k] for k in ("taxa_minima", "taxa_12_29", "taxa_29_50", "taxa_50_79"))
+    divisor = 1 - ((taxa_ml_pct + imposto_pct) / 100)
+    if divisor <= 0: return 0.0, "Erro"
+    preco_est_1 = (custo_base + frete_manual + lucro_alvo_reais) / divisor
+    if preco_est_1 >= 79.00: return preco_est_1, "Frete Manual"
+    for taxa, nome, p_min, p_max in [(taxa_50_79, "Tab. 50-79", 50, 79), (taxa_29_50, "Tab. 29-50", 29, 50), (taxa_12_29, "Tab. 12-29", 12.5, 29)]:
+        preco = (custo_base + taxa + lucro_alvo_reais) / divisor
+        if p_min <= preco < p_max: return preco, nome
+    # Nenhuma faixa consistente (o preço de uma cai em outra): frete manual
+    return preco_est_1, "Frete Manual"
+
+def reverso_escalar(custo_base, lucro_alvo_reais, taxa_ml_pct, imposto_pct, frete_manual, regras, categoria=""):
+    # A mesma regra, faixa a faixa, para qualquer tabela de regras (frete por categoria, faixa manual no meio)
+    divisor = 1 - ((taxa_ml_pct + imposto_pct) / 100)
+    if divisor <= 0: return 0.0, "Erro"
+    faixas = regras["faixas"]
+    fretes = regras["frete_por_categoria"].get(categoria, {})
+    for i in range(len(faixas) - 1, 0 if len(faixas) > 1 else -1, -1):
+        inferior = faixas[i - 1]["ate"] if i else 0.0
+        superior = faixas[i]["ate"] if faixas[i]["ate"] is not None else math.inf
+        frete = fretes.get(faixas[i]["nome"], faixas[i]["frete"])
+        preco = (custo_base + (frete_manual if frete is None else frete) + lucro_alvo_reais) / divisor
+        if inferior <= preco < superior: return preco, "Frete Manual" if frete is None else faixas[i]["nome"]
+    return (custo_base + frete_manual + lucro_alvo_reais) / divisor, "Frete Manual"
+
+def entradas(n, semente):
+    rng = np.random.default_rng(semente)
+    return rng.uniform(0, 80, n), rng.uniform(-5, 30, n), rng.uniform(5, 80, n), rng.uniform(0, 30, n)
+
+def conferir(esperado, preco, nome):
+    assert [e[1] for e in esperado] == nome.tolist()
+    np.testing.assert_allclose([e[0] for e in esperado], preco, rtol=1e-12)
+
+def test_lote_igual_a_funcao_escalar_original():
+    custo, lucro, taxa, frete = entradas(20000, 0)
+    preco, nome = resolver_preco_reverso(custo, lucro, taxa, 27.0, frete, montar_tabela_frete())
+    esperado = [reverso_legado(*linha, 27.0, f) for *linha, f in zip(custo, lucro, taxa, frete)]
+    conferir(esperado, preco, nome)
+    # As entradas cobrem o caso do buraco entre faixas, o de abaixo da primeira faixa e o divisor inválido
+    assert sum(n == "Frete Manual" and p < 79 for p, n in esperado) > 0
+    assert sum(n == "Erro" for _, n in esperado) > 0
+
+def test_lote_igual_a_escalar_com_regras_por_categoria():
+    regras = regras_frete()
+    regras["faixas"].insert(2, {"nome": "Promo", "ate": 40.0, "frete": None})
+    regras["frete_por_categoria"] = {"Casa": {"Tab. 50-79": 12.0, "Tab. 12-29": None}, "Beleza": {"manual": 20.0}}
+    regras = normalizar_regras(regras)
+    custo, lucro, taxa, frete = entradas(5000, 1)
+    categorias = np.random.default_rng(2).choice(["", "Casa", "Beleza", "Outra"], len(custo))
+    preco, nome = resolver_preco_reverso(custo, lucro, taxa, 18.0, frete, compilar_regras(regras), categorias)
+    conferir([reverso_escalar(*linha, 18.0, f, regras, c) for *linha, f, c in zip(custo, lucro, taxa, frete, categorias)], preco, nome)
+
+def test_tabela_de_uma_faixa():
+    regras = normalizar_regras({"faixas": [{"nome": "Única", "frete": 9.0}]})
+    preco, nome = resolver_preco_reverso([10.0], [5.0], [10.0], 10.0, [3.0], compilar_regras(regras))
+    assert nome.tolist() == ["Única"] and np.isclose(preco[0], 24.0 / 0.8)